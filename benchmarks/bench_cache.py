@@ -0,0 +1,35 @@
+"""Hit latency of TTLCache as the number of live entries grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cache
+"""
+import random
+import time
+
+from bot.utils.cache import TTLCache
+
+SIZES = [512, 4_096, 32_768, 262_144, 1_000_000]
+LOOKUPS = 200_000
+
+
+def bench(size: int) -> float:
+    cache = TTLCache(maxsize=size, ttl=3600)
+    keys = [f"key:{i}" for i in range(size)]
+    for k in keys:
+        cache.set(k, k)
+    probe = [random.choice(keys) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for k in probe:
+        cache.get(k)
+    return (time.perf_counter() - start) / LOOKUPS * 1e9
+
+
+def main() -> None:
+    print(f"{'entries':>10}  {'ns/hit':>8}")
+    for size in SIZES:
+        print(f"{size:>10}  {bench(size):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
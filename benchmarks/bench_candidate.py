@@ -0,0 +1,85 @@
+"""Memory and sort cost of image candidates: the old per-image dicts
+against ImageCandidate.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_candidate
+"""
+import random
+import time
+import tracemalloc
+
+from bot.utils.candidate import ImageCandidate
+
+SIZES = [100, 1_000, 10_000]
+SOURCES = ["google", "bing", "fanart", "theposterdb", "wikimedia"]
+ROUNDS = 5
+
+
+def _fields(i: int) -> dict:
+    path = f"/{i:08d}abcdefghijklmnop.jpg"
+    return {
+        "url": f"https://img.example/original{path}",
+        "type": random.choice(("poster", "backdrop")),
+        "width": random.randint(200, 4000),
+        "height": random.randint(200, 4000),
+        "popularity": random.randint(0, 5000),
+        "clean": random.random() < 0.3,
+        "source": random.choice(SOURCES),
+        "variants": [[342, f"https://img.example/w342{path}"]],
+        "thumb": f"https://img.example/w92{path}",
+    }
+
+
+# Both builders share the URL strings in `raw` and build their own
+# variant lists, so the numbers compare container overhead only.
+def as_dicts(raw: list) -> list:
+    return [dict(r, variants=[list(v) for v in r["variants"]]) for r in raw]
+
+
+def as_candidates(raw: list) -> list:
+    return [ImageCandidate(**r) for r in raw]
+
+
+def measure(build, raw: list) -> int:
+    tracemalloc.start()
+    items = build(raw)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return size
+
+
+def dict_score(x: dict) -> int:
+    res = (x.get("width") or 0) * (x.get("height") or 0)
+    return res * 3 + (x.get("popularity") or 0) * 5 + (50 if x.get("clean") else 0)
+
+
+def slot_score(x: ImageCandidate) -> int:
+    res = (x.width or 0) * (x.height or 0)
+    return res * 3 + x.popularity * 5 + (50 if x.clean else 0)
+
+
+def timed(items: list, key) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        sorted(items, key=key, reverse=True)
+    return (time.perf_counter() - start) / ROUNDS * 1e3
+
+
+def main() -> None:
+    print(f"{'items':>8}  {'dict KiB':>9}  {'slots KiB':>9}  {'dict sort ms':>12}  {'slots sort ms':>13}")
+    for n in SIZES:
+        raw = [_fields(i) for i in range(n)]
+        dict_mem = measure(as_dicts, raw)
+        slot_mem = measure(as_candidates, raw)
+        dicts = as_dicts(raw)
+        slots = as_candidates(raw)
+        print(
+            f"{n:>8}  {dict_mem / 1024:>9.0f}  {slot_mem / 1024:>9.0f}"
+            f"  {timed(dicts, dict_score):>12.2f}  {timed(slots, slot_score):>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
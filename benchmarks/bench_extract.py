@@ -0,0 +1,73 @@
+"""Image-result extraction from Google and Bing HTML: the old per-call
+regex over the whole page against the precompiled extractors, fed the
+whole page or 16 KiB chunks, with and without a result cap.
+
+Run from the repository root, optionally on other saved result pages:
+
+    python -m benchmarks.bench_extract [google.html bing.html]
+
+Without arguments it uses the pages under tests/fixtures.
+"""
+import sys
+import time
+
+from bot.utils.extract import BingExtractor, GoogleExtractor, extract
+
+ROUNDS = 20
+CHUNK = 16 * 1024
+CAP = 4
+FIXTURES = "tests/fixtures"
+
+
+def legacy(page: str, skip: str) -> list:
+    import re
+
+    pattern = r"https://[^\"']+?.(?:jpg|jpeg|png)"
+    return [m.group(0) for m in re.finditer(pattern, page) if skip not in m.group(0)]
+
+
+def chunked(extractor, page: bytes) -> list:
+    for i in range(0, len(page), CHUNK):
+        extractor.feed(page[i : i + CHUNK])
+        if extractor.done:
+            break
+    else:
+        extractor.close()
+    return extractor.hits
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = fn()
+    return (time.perf_counter() - start) / ROUNDS * 1e3, len(result)
+
+
+def main() -> None:
+    paths = sys.argv[1:3]
+    if len(paths) != 2:
+        paths = [f"{FIXTURES}/google_images.html", f"{FIXTURES}/bing_images.html"]
+    with open(paths[0], encoding="utf-8") as f:
+        google = f.read()
+    with open(paths[1], encoding="utf-8") as f:
+        bing = f.read()
+
+    print(f"{'page':>7}  {'KiB':>5}  {'variant':<18}  {'ms':>7}  {'hits':>5}")
+    for name, page, cls, skip in (
+        ("google", google, GoogleExtractor, "gstatic"),
+        ("bing", bing, BingExtractor, "mm.bing.net"),
+    ):
+        raw = page.encode("utf-8")
+        rows = [
+            ("legacy regex", lambda: legacy(page, skip)),
+            ("extract, whole", lambda: extract(cls(), page)),
+            ("extract, chunked", lambda: chunked(cls(), raw)),
+            (f"chunked, cap {CAP}", lambda: chunked(cls(CAP), raw)),
+        ]
+        for label, fn in rows:
+            ms, hits = timed(fn)
+            print(f"{name:>7}  {len(raw) // 1024:>5}  {label:<18}  {ms:>7.2f}  {hits:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Ranking cost on large candidate lists: the old per-item key function
+against the NumPy feature matrix, full sort and top-k.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ranking
+"""
+import random
+import time
+
+from bot.utils.candidate import ImageCandidate, ImageType
+from bot.utils.ranking import SOURCE_TRUST, rank_images
+
+SIZES = [100, 1_000, 10_000, 100_000]
+TOP_K = 60
+ROUNDS = 5
+
+
+def candidates(n: int) -> list:
+    sources = list(SOURCE_TRUST)
+    items = []
+    for i in range(n):
+        known = random.random() < 0.7
+        items.append(
+            ImageCandidate(
+                f"https://img.example/{i}.jpg",
+                type=random.choice(list(ImageType)),
+                width=random.randint(200, 4000) if known else None,
+                height=random.randint(200, 4000) if known else None,
+                popularity=random.randint(0, 5000),
+                clean=random.random() < 0.2,
+                validated=random.random() < 0.5,
+                source=random.choice(sources),
+            )
+        )
+    return items
+
+
+def legacy_sort(items: list) -> list:
+    def score(x):
+        res = (x.width or 0) * (x.height or 0)
+        return res * 3 + x.popularity * 5 + (50 if x.clean else 0)
+
+    return sorted(items, key=score, reverse=True)
+
+
+def timed(fn, items) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(items)
+    return (time.perf_counter() - start) / ROUNDS * 1e3
+
+
+def main() -> None:
+    print(f"{'items':>8}  {'legacy ms':>10}  {'full ms':>8}  {'top-' + str(TOP_K) + ' ms':>10}")
+    for n in SIZES:
+        items = candidates(n)
+        legacy = timed(legacy_sort, items)
+        full = timed(rank_images, items)
+        top = timed(lambda x: rank_images(x, k=TOP_K), items)
+        print(f"{n:>8}  {legacy:>10.2f}  {full:>8.2f}  {top:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Title index lookups at 100k titles: exact keys, queries with one or two
+typos, unknown titles and prefix completion, against a linear scan with
+the same edit-distance check.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_titles [titles]
+"""
+import random
+import string
+import sys
+import time
+
+from bot.utils.bktree import levenshtein
+from bot.utils.titleindex import TitleIndex, max_distance, normalize
+
+QUERIES = 500
+
+WORDS = (
+    "the of and a in to night dark star love war last man girl house dead "
+    "king city blood world day time black white shadow dragon ghost queen "
+    "secret lost hunter legend rising return fire ice moon sun sky sea red "
+    "blue story tale quest empire kingdom academy hero demon spirit sword "
+    "heart road river island garden winter summer spring autumn storm iron "
+    "golden silver crystal broken hidden final first wild little great"
+).split()
+
+
+def make_title(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(1, 4))]
+    # A made-up word keeps most titles distinct, like real catalogues.
+    words.insert(rng.randrange(len(words) + 1), "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 8))))
+    return " ".join(words).title()
+
+
+def typo(rng: random.Random, text: str, edits: int) -> str:
+    chars = list(text)
+    for _ in range(edits):
+        i = rng.randrange(len(chars))
+        op = rng.choice("sdi")
+        if op == "s":
+            chars[i] = rng.choice(string.ascii_lowercase)
+        elif op == "d" and len(chars) > 1:
+            del chars[i]
+        else:
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+    return "".join(chars)
+
+
+def timed(fn, queries) -> tuple:
+    found = 0
+    start = time.perf_counter()
+    for q in queries:
+        found += bool(fn(q))
+    return (time.perf_counter() - start) / len(queries) * 1e6, found
+
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(1)
+    names = [make_title(rng) for _ in range(size)]
+
+    index = TitleIndex(maxsize=size)
+    start = time.perf_counter()
+    for i, name in enumerate(names):
+        index.add({"media_type": "movie", "id": i, "title": name, "popularity": rng.random()})
+    # complete() sorts the keys once after they change; count it as build.
+    index.complete("a")
+    build = time.perf_counter() - start
+    keys = [normalize(n) for n in names]
+    print(f"{size} titles indexed in {build:.2f}s")
+
+    sample = rng.sample(names, QUERIES)
+    one = [typo(rng, n, 1) for n in sample]
+    two = [typo(rng, n, 2) for n in sample if len(normalize(n)) >= 8]
+    unknown = [make_title(rng) for _ in range(QUERIES)]
+    prefixes = [n[: rng.randint(3, 8)] for n in sample]
+
+    def scan(q: str) -> list:
+        key = normalize(q)
+        d = max_distance(key)
+        return [k for k in keys if abs(len(k) - len(key)) <= d and levenshtein(key, k, d) <= d]
+
+    print(f"{'query':<16}  {'variant':<16}  {'us/lookup':>10}  {'found':>7}")
+    rows = [
+        ("exact", "lookup", index.lookup, sample),
+        ("one typo", "search", index.search, one),
+        ("two typos", "search", index.search, two),
+        ("unknown", "search", index.search, unknown),
+        ("prefix", "complete", index.complete, prefixes),
+        ("one typo", "linear scan", scan, one[:20]),
+    ]
+    for label, variant, fn, queries in rows:
+        us, found = timed(fn, queries)
+        print(f"{label:<16}  {variant:<16}  {us:>10.1f}  {found:>3}/{len(queries):<3}")
+
+
+if __name__ == "__main__":
+    main()
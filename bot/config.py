@@ -9,10 +9,62 @@ class Config:
     OMDB_API_KEY: str
     REDIS_URL: str | None
     DEBUG: bool
+    ADMIN_IDS: list[int]
     DEFAULT_LANGUAGE: str
     POSTER_PAGE_SIZE: int
     CACHE_TTL_SECONDS: int
+    CACHE_NAMESPACE_TTLS: dict[str, int]
+    NEGATIVE_CACHE_TTL_SECONDS: int
+    CACHE_MAX_BYTES: int
+    STALE_TTL_SECONDS: int
+    PREWARM_INTERVAL_SECONDS: int
+    STORE_PATH: str
+    STORE_TTL_SECONDS: int
+    STORE_COMPACT_INTERVAL_SECONDS: int
+    FILE_ID_TTL_SECONDS: int
+    PREVIEW_IMAGE_WIDTH: int
+    PREFETCH_DEPTH: int
+    PREFETCH_GLOBAL_LIMIT: int
+    PREFETCH_PER_USER: int
+    PREFETCH_IDLE_SECONDS: int
+    PREFETCH_CHAT_ID: int | None
+    VALIDATE_IMAGES: bool
+    VALIDATION_CONCURRENCY: int
+    VALIDATION_TTL_SECONDS: int
+    VALIDATION_NEGATIVE_TTL_SECONDS: int
+    PROBE_DIMENSIONS: bool
+    NEAR_DUPLICATES: bool
+    PHASH_DISTANCE: int
+    PHASH_CONCURRENCY: int
+    PHASH_TTL_SECONDS: int
     REQUEST_TIMEOUT: int
+    AGGREGATE_TIMEOUT: float
+    PROGRESSIVE_POSTERS: bool
+    HTTP_POOL_SIZE: int
+    HTTP_POOL_PER_HOST: int
+    HTTP_KEEPALIVE: float
+    DNS_CACHE_TTL: int
+    RANK_WEIGHTS: dict[str, float]
+    MAX_CAROUSEL_IMAGES: int
+    SESSION_IDLE_SECONDS: int
+    MAX_SESSIONS_PER_USER: int
+    HOST_RATE_LIMITS: dict[str, tuple[float, int]]
+    RATE_LIMIT_MAX_WAIT: float
+    BREAKER_FAILURES: int
+    BREAKER_RESET_SECONDS: float
+    BATCH_SITE_SCRAPES: bool
+    SITES_PER_QUERY: int
+    SCRAPE_MAX_RESULTS: int
+    IMDB_TTL_SECONDS: int
+    TITLE_INDEX_SIZE: int
+    INLINE_DEBOUNCE_SECONDS: float
+    INLINE_MIN_QUERY_LENGTH: int
+    INLINE_PAGE_SIZE: int
+    INLINE_CACHE_SECONDS: int
+    SCRAPE_TIMEOUT_SHARE: float
+
+    def cache_ttl(self, namespace: str) -> int:
+        return self.CACHE_NAMESPACE_TTLS.get(namespace, self.CACHE_TTL_SECONDS)
 
     @staticmethod
     def from_env() -> "Config":
@@ -22,10 +74,90 @@ class Config:
             OMDB_API_KEY=os.environ.get("OMDB_API_KEY", ""),
             REDIS_URL=os.environ.get("REDIS_URL"),
             DEBUG=os.environ.get("DEBUG", "false").lower() == "true",
+            ADMIN_IDS=[
+                int(x) for x in os.environ.get("ADMIN_IDS", "").split(",") if x.strip()
+            ],
             DEFAULT_LANGUAGE=os.environ.get("DEFAULT_LANGUAGE", "en-US"),
             POSTER_PAGE_SIZE=int(os.environ.get("POSTER_PAGE_SIZE", "6")),
             CACHE_TTL_SECONDS=int(os.environ.get("CACHE_TTL_SECONDS", "900")),
+            CACHE_NAMESPACE_TTLS={
+                ns.strip(): int(ttl)
+                for ns, _, ttl in (
+                    item.partition("=")
+                    for item in os.environ.get("CACHE_NAMESPACE_TTLS", "").split(",")
+                )
+                if ns.strip() and ttl.strip()
+            },
+            NEGATIVE_CACHE_TTL_SECONDS=int(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", "60")),
+            CACHE_MAX_BYTES=int(os.environ.get("CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            STALE_TTL_SECONDS=int(os.environ.get("STALE_TTL_SECONDS", "3600")),
+            PREWARM_INTERVAL_SECONDS=int(os.environ.get("PREWARM_INTERVAL_SECONDS", "300")),
+            STORE_PATH=os.environ.get("STORE_PATH", "data/poster.db"),
+            STORE_TTL_SECONDS=int(os.environ.get("STORE_TTL_SECONDS", str(7 * 24 * 3600))),
+            STORE_COMPACT_INTERVAL_SECONDS=int(os.environ.get("STORE_COMPACT_INTERVAL_SECONDS", "3600")),
+            FILE_ID_TTL_SECONDS=int(os.environ.get("FILE_ID_TTL_SECONDS", str(30 * 24 * 3600))),
+            PREVIEW_IMAGE_WIDTH=int(os.environ.get("PREVIEW_IMAGE_WIDTH", "500")),
+            PREFETCH_DEPTH=int(os.environ.get("PREFETCH_DEPTH", "2")),
+            PREFETCH_GLOBAL_LIMIT=int(os.environ.get("PREFETCH_GLOBAL_LIMIT", "8")),
+            PREFETCH_PER_USER=int(os.environ.get("PREFETCH_PER_USER", "2")),
+            PREFETCH_IDLE_SECONDS=int(os.environ.get("PREFETCH_IDLE_SECONDS", "120")),
+            PREFETCH_CHAT_ID=int(os.environ["PREFETCH_CHAT_ID"])
+            if os.environ.get("PREFETCH_CHAT_ID")
+            else None,
+            VALIDATE_IMAGES=os.environ.get("VALIDATE_IMAGES", "true").lower() == "true",
+            VALIDATION_CONCURRENCY=int(os.environ.get("VALIDATION_CONCURRENCY", "16")),
+            VALIDATION_TTL_SECONDS=int(os.environ.get("VALIDATION_TTL_SECONDS", str(24 * 3600))),
+            VALIDATION_NEGATIVE_TTL_SECONDS=int(os.environ.get("VALIDATION_NEGATIVE_TTL_SECONDS", "600")),
+            PROBE_DIMENSIONS=os.environ.get("PROBE_DIMENSIONS", "true").lower() == "true",
+            NEAR_DUPLICATES=os.environ.get("NEAR_DUPLICATES", "true").lower() == "true",
+            PHASH_DISTANCE=int(os.environ.get("PHASH_DISTANCE", "6")),
+            PHASH_CONCURRENCY=int(os.environ.get("PHASH_CONCURRENCY", "8")),
+            PHASH_TTL_SECONDS=int(os.environ.get("PHASH_TTL_SECONDS", str(30 * 24 * 3600))),
             REQUEST_TIMEOUT=int(os.environ.get("REQUEST_TIMEOUT", "10")),
+            AGGREGATE_TIMEOUT=float(os.environ.get("AGGREGATE_TIMEOUT", "8")),
+            PROGRESSIVE_POSTERS=os.environ.get("PROGRESSIVE_POSTERS", "true").lower() == "true",
+            HTTP_POOL_SIZE=int(os.environ.get("HTTP_POOL_SIZE", "100")),
+            HTTP_POOL_PER_HOST=int(os.environ.get("HTTP_POOL_PER_HOST", "20")),
+            HTTP_KEEPALIVE=float(os.environ.get("HTTP_KEEPALIVE", "30")),
+            DNS_CACHE_TTL=int(os.environ.get("DNS_CACHE_TTL", "300")),
+            RANK_WEIGHTS={
+                name.strip(): float(weight)
+                for name, _, weight in (
+                    item.partition("=")
+                    for item in os.environ.get("RANK_WEIGHTS", "").split(",")
+                )
+                if name.strip() and weight.strip()
+            },
+            MAX_CAROUSEL_IMAGES=int(os.environ.get("MAX_CAROUSEL_IMAGES", "60")),
+            SESSION_IDLE_SECONDS=int(os.environ.get("SESSION_IDLE_SECONDS", "1800")),
+            MAX_SESSIONS_PER_USER=int(os.environ.get("MAX_SESSIONS_PER_USER", "5")),
+            # host=requests_per_second:burst
+            HOST_RATE_LIMITS={
+                host.strip(): (float(rate), int(burst))
+                for host, _, limit in (
+                    item.partition("=")
+                    for item in os.environ.get(
+                        "HOST_RATE_LIMITS",
+                        "www.google.com=1:4,www.bing.com=2:6,"
+                        "api.themoviedb.org=40:40,www.omdbapi.com=10:10,www.imdb.com=5:10",
+                    ).split(",")
+                )
+                if host.strip() and limit.strip()
+                for rate, _, burst in [limit.partition(":")]
+            },
+            RATE_LIMIT_MAX_WAIT=float(os.environ.get("RATE_LIMIT_MAX_WAIT", "2")),
+            BREAKER_FAILURES=int(os.environ.get("BREAKER_FAILURES", "5")),
+            BREAKER_RESET_SECONDS=float(os.environ.get("BREAKER_RESET_SECONDS", "30")),
+            BATCH_SITE_SCRAPES=os.environ.get("BATCH_SITE_SCRAPES", "true").lower() == "true",
+            SITES_PER_QUERY=int(os.environ.get("SITES_PER_QUERY", "10")),
+            SCRAPE_MAX_RESULTS=int(os.environ.get("SCRAPE_MAX_RESULTS", "40")),
+            IMDB_TTL_SECONDS=int(os.environ.get("IMDB_TTL_SECONDS", str(14 * 24 * 3600))),
+            TITLE_INDEX_SIZE=int(os.environ.get("TITLE_INDEX_SIZE", "100000")),
+            INLINE_DEBOUNCE_SECONDS=float(os.environ.get("INLINE_DEBOUNCE_SECONDS", "0.6")),
+            INLINE_MIN_QUERY_LENGTH=int(os.environ.get("INLINE_MIN_QUERY_LENGTH", "3")),
+            INLINE_PAGE_SIZE=int(os.environ.get("INLINE_PAGE_SIZE", "20")),
+            INLINE_CACHE_SECONDS=int(os.environ.get("INLINE_CACHE_SECONDS", "300")),
+            SCRAPE_TIMEOUT_SHARE=float(os.environ.get("SCRAPE_TIMEOUT_SHARE", "0.6")),
         )
 
 
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+from typing import Dict, List
+from urllib.parse import urlsplit
+from telegram import InlineQueryResultPhoto, Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from ..config import config
+from ..services import carousel
+from ..services.aggregator import get_metadata_and_images
+from ..utils.candidate import ImageCandidate
+from ..utils.helpers import build_caption_box, extract_year_from_query, hash_url, normalize_query, pick_variant
+
+logger = logging.getLogger(__name__)
+
+# Telegram caps an answer at 50 results.
+MAX_PAGE = 50
+
+# Newest inline query id per user while it waits out the debounce.
+_latest: Dict[int, str] = {}
+
+
+async def _settled(user_id: int, query_id: str) -> bool:
+    # Clients send a query per keystroke. Only the one the user stopped
+    # typing at is served; the ones it superseded return unanswered.
+    _latest[user_id] = query_id
+    await asyncio.sleep(config.INLINE_DEBOUNCE_SECONDS)
+    if _latest.get(user_id) != query_id:
+        return False
+    del _latest[user_id]
+    return True
+
+
+def _jpeg(item: ImageCandidate) -> bool:
+    # Inline photo results must be JPEG; TMDB and IMDb renditions are.
+    path = urlsplit(pick_variant(item, config.PREVIEW_IMAGE_WIDTH)).path.lower()
+    return path.endswith((".jpg", ".jpeg"))
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    iq = update.inline_query
+    if not iq:
+        return
+    text = normalize_query(iq.query)
+    if len(text) < config.INLINE_MIN_QUERY_LENGTH:
+        return
+    offset = int(iq.offset) if iq.offset.isdigit() else 0
+    # Follow-up pages come from scrolling, not typing: no debounce.
+    if not offset and not await _settled(iq.from_user.id, iq.id):
+        return
+
+    title, year = extract_year_from_query(text)
+    # Every page reads the same snapshot, so offsets stay stable. It is
+    # taken from the shared list /p uses for the same query, and identical
+    # queries from other users coalesce in the aggregator.
+    key = carousel.carousel_key(title, year)
+    meta = carousel.shared(f"inline:{key}")
+    if meta is None:
+        meta = carousel.shared(key) or await get_metadata_and_images(title, year)
+        if meta and meta["images"]:
+            carousel.keep(key, meta)
+            meta = carousel.snapshot(key, dict(meta, images=[i for i in meta["images"] if _jpeg(i)]))
+
+    results: List[InlineQueryResultPhoto] = []
+    next_offset = ""
+    if meta and meta["images"]:
+        caption = build_caption_box(
+            meta["title"],
+            meta["year"],
+            meta["rating"],
+            meta["content_type"],
+            meta["overview"],
+            meta["genres"],
+            audio_info=None,
+        )
+        size = min(config.INLINE_PAGE_SIZE, MAX_PAGE)
+        images = meta["images"]
+        for item in images[offset : offset + size]:
+            results.append(
+                InlineQueryResultPhoto(
+                    id=hash_url(item.url)[:32],
+                    photo_url=pick_variant(item, config.PREVIEW_IMAGE_WIDTH),
+                    # TMDB w92/w300 renditions; the smallest variant otherwise.
+                    thumbnail_url=item.thumb or pick_variant(item, 0),
+                    title=meta["title"],
+                    caption=caption,
+                )
+            )
+        if offset + size < len(images):
+            next_offset = str(offset + size)
+
+    try:
+        await iq.answer(
+            results,
+            cache_time=config.INLINE_CACHE_SECONDS,
+            is_personal=False,
+            next_offset=next_offset,
+        )
+    except BadRequest as exc:
+        if "query is too old" in exc.message.lower():
+            # The client moved on while the aggregation ran.
+            logger.debug("Inline answer for %r dropped: %s", text, exc)
+        else:
+            logger.warning("Inline answer for %r rejected: %s", text, exc)
@@ -1,17 +1,74 @@
-from typing import Any, Dict, List
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, Message
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
-from ..services.aggregator import get_metadata_and_images
-from ..utils.helpers import extract_year_from_query, build_caption_box
+from ..config import config
+from ..services import carousel, file_ids, phash, prefetch
+from ..services.aggregator import get_metadata, complete_images, iter_scraped_images, suggest_titles
+from ..utils.candidate import ImageCandidate
+from ..utils.helpers import extract_year_from_query, build_caption_box, merge_images, pick_variant
 
+logger = logging.getLogger(__name__)
 
-SESSION_KEY = "poster_sessions"
 
+async def _reply_photo(message: Message, url: str, **kwargs: Any) -> Message:
+    file_id = await file_ids.lookup(url)
+    if file_id:
+        try:
+            return await message.reply_photo(photo=file_id, **kwargs)
+        except BadRequest:
+            logger.info("Cached file_id rejected, re-sending %s by URL", url)
+    msg = await message.reply_photo(photo=url, **kwargs)
+    await file_ids.remember(url, msg)
+    return msg
 
-def _get_sessions(context: ContextTypes.DEFAULT_TYPE) -> Dict[str, Any]:
-    if SESSION_KEY not in context.user_data:
-        context.user_data[SESSION_KEY] = {}
-    return context.user_data[SESSION_KEY]
+
+async def _edit_photo(
+    message: Message, url: str, caption: str, reply_markup: Optional[InlineKeyboardMarkup]
+) -> None:
+    file_id = await file_ids.lookup(url)
+    if file_id:
+        try:
+            media = InputMediaPhoto(media=file_id, caption=caption)
+            await message.edit_media(media=media, reply_markup=reply_markup)
+            return
+        except BadRequest:
+            logger.info("Cached file_id rejected, re-sending %s by URL", url)
+    media = InputMediaPhoto(media=url, caption=caption)
+    msg = await message.edit_media(media=media, reply_markup=reply_markup)
+    await file_ids.remember(url, msg)
+
+
+def _prefetch_around(
+    context: ContextTypes.DEFAULT_TYPE,
+    session: Dict[str, Any],
+    images: List[ImageCandidate],
+    user_id: int,
+) -> None:
+    nearby = prefetch.neighbours(images, session["index"], config.PREFETCH_DEPTH)
+    urls = [pick_variant(i, config.PREVIEW_IMAGE_WIDTH) for i in nearby]
+    prefetch.schedule(context.application, session, user_id, urls)
+
+
+async def _grow_session(session: Dict[str, Any], meta: Dict[str, Any], timeout: float) -> None:
+    # Progressive mode: scraped images land in the shared carousel list
+    # while the user is already paging through the TMDB results.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        async for batch in iter_scraped_images(meta, timeout):
+            batch = await phash.drop_near_duplicates(
+                batch, deadline - loop.time(), existing=meta["images"]
+            )
+            merge_images(
+                meta["images"], batch, start=session["index"] + 1, limit=config.MAX_CAROUSEL_IMAGES
+            )
+            carousel.keep(session["key"], meta)
+    except Exception:
+        logger.exception("Background image aggregation failed for %s", meta.get("title"))
 
 
 async def p_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -29,20 +86,27 @@ async def p_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     title, year = extract_year_from_query(query_text)
 
     await update.message.chat.send_chat_action("upload_photo")
-    meta = await get_metadata_and_images(title, year)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.AGGREGATE_TIMEOUT
+    # Another session on the same query already holds the ranked list.
+    meta = carousel.shared(carousel.carousel_key(title, year))
+    progressive = False
+    if meta is None:
+        meta = await get_metadata(title, year)
+        progressive = bool(config.PROGRESSIVE_POSTERS and meta and meta["images"])
+        if meta and not progressive:
+            await complete_images(meta, deadline - loop.time())
     if not meta or not meta.get("images"):
-        await update.message.reply_text("No posters found for your query.")
+        text = "No posters found for your query."
+        suggestions = suggest_titles(title)
+        if suggestions:
+            text += "\nDid you mean: " + ", ".join(suggestions) + "?"
+        await update.message.reply_text(text)
         return
 
-    images: List[Dict[str, Any]] = meta["images"]
-    sessions = _get_sessions(context)
+    images: List[ImageCandidate] = meta["images"]
     session_id = str(update.message.message_id)
-    sessions[session_id] = {
-        "meta": meta,
-        "index": 0,
-        "total": len(images),
-        "message_id": None,
-    }
+    session = carousel.open_session(context.user_data, session_id, title, year, meta)
 
     first = images[0]
     caption = build_caption_box(
@@ -63,12 +127,18 @@ async def p_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             [InlineKeyboardButton("Select 🎯", callback_data=f"poster:{session_id}:select")],
         ]
     )
-    msg = await update.message.reply_photo(
-        photo=first["url"],
+    msg = await _reply_photo(
+        update.message,
+        pick_variant(first, config.PREVIEW_IMAGE_WIDTH),
         caption=caption,
         reply_markup=keyboard,
     )
-    sessions[session_id]["message_id"] = msg.message_id
+    session["message_id"] = msg.message_id
+    _prefetch_around(context, session, images, update.effective_user.id)
+    if progressive:
+        context.application.create_task(
+            _grow_session(session, meta, deadline - loop.time()), update=update
+        )
 
 
 async def poster_pagination_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -80,21 +150,24 @@ async def poster_pagination_callback(update: Update, context: ContextTypes.DEFAU
     if not data.startswith("poster:"):
         return
     _, session_id, action = data.split(":", 2)
-    sessions = _get_sessions(context)
-    session = sessions.get(session_id)
-    if not session:
+    session = carousel.get_session(context.user_data, session_id)
+    meta = await carousel.load(session) if session else None
+    if not meta:
         await query.edit_message_caption(caption="Session expired. Please use /p again.")
         return
 
-    meta = session["meta"]
-    images: List[Dict[str, Any]] = meta["images"]
+    session["last_active"] = time.time()
+    images: List[ImageCandidate] = meta["images"]
     idx = session["index"]
-    total = session["total"]
+    total = len(images)
 
-    if action == "next":
-        idx = (idx + 1) % total
-    elif action == "prev":
-        idx = (idx - 1) % total
+    if action in ("next", "prev"):
+        step = 1 if action == "next" else -1
+        # Skip images the prefetcher already found to be dead.
+        for _ in range(total):
+            idx = (idx + step) % total
+            if not prefetch.is_dead(pick_variant(images[idx], config.PREVIEW_IMAGE_WIDTH)):
+                break
     elif action == "select":
         final = images[idx]
         caption = build_caption_box(
@@ -106,11 +179,12 @@ async def poster_pagination_callback(update: Update, context: ContextTypes.DEFAU
             meta["genres"],
             audio_info=None,
         )
-        await query.message.reply_photo(photo=final["url"], caption=caption)
+        await _reply_photo(query.message, final.url, caption=caption)
         return
 
     session["index"] = idx
     new_img = images[idx]
+    session["url"] = new_img.url
     caption = build_caption_box(
         meta["title"],
         meta["year"],
@@ -129,5 +203,7 @@ async def poster_pagination_callback(update: Update, context: ContextTypes.DEFAU
             [InlineKeyboardButton("Select 🎯", callback_data=f"poster:{session_id}:select")],
         ]
     )
-    media = InputMediaPhoto(media=new_img["url"], caption=caption)
-    await query.message.edit_media(media=media, reply_markup=keyboard)
+    await _edit_photo(
+        query.message, pick_variant(new_img, config.PREVIEW_IMAGE_WIDTH), caption, keyboard
+    )
+    _prefetch_around(context, session, images, update.effective_user.id)
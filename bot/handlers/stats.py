@@ -0,0 +1,49 @@
+from typing import List
+from telegram import Update
+from telegram.ext import ContextTypes
+from ..config import config
+from ..services import aggregator, carousel
+from ..utils import cache, ratelimit, singleflight
+
+
+def _is_admin(update: Update) -> bool:
+    # No ADMIN_IDS means no admins: upstream and cache state stays private.
+    user = update.effective_user
+    return bool(user and user.id in config.ADMIN_IDS)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not update.message or not _is_admin(update):
+        return
+    lines: List[str] = ["📊 Request coalescing:"]
+    for name, s in singleflight.stats().items():
+        lines.append(
+            f"- {name}: {s['calls']} calls, {s['coalesced']} coalesced, {s['inflight']} in flight"
+        )
+    lines.append("")
+    lines.append("🗄 Caches:")
+    for name, s in cache.stats().items():
+        used = f"{s['bytes'] // 1024} KiB"
+        if s["maxbytes"]:
+            used += f" of {s['maxbytes'] // 1024} KiB"
+        lines.append(f"- {name}: {s['entries']}/{s['maxsize']} entries, {used}")
+    lines.append("")
+    lines.append("🚦 Upstream hosts:")
+    for host, s in ratelimit.stats().items():
+        lines.append(
+            f"- {host}: {s['state']}, {s['tokens']} tokens, {s['allowed']} allowed, "
+            f"{s['throttled']} throttled, {s['rejected']} rejected, {s['trips']} trips"
+        )
+    t = aggregator.titles.stats()
+    lines.append("")
+    lines.append("🔎 Title index:")
+    lines.append(
+        f"- {t['titles']} titles, {t['hits']} exact hits, {t['fuzzy_hits']} typo matches, "
+        f"{t['misses']} misses"
+    )
+    held = carousel.stats(context.application.user_data)
+    lines.append("")
+    lines.append("🖼 Poster sessions:")
+    lines.append(f"- {held['sessions']} sessions, {held['bytes'] // 1024} KiB")
+    lines.append(f"- {held['carousels']} shared result lists, {held['carousel_bytes'] // 1024} KiB")
+    await update.message.reply_text("\n".join(lines))
@@ -1,11 +1,17 @@
 import asyncio
 import logging
+from typing import Any, Coroutine
 from telegram.ext import (
     Application,
     CommandHandler,
+    InlineQueryHandler,
 )
 from .config import config
+from .services import aggregator, carousel, http, tmdb
+from .utils import cache, ranking
+from .utils.store import store
 from .handlers.poster import p_command
+from .handlers.inline import inline_query
 from .handlers.movies import (
     start,
     movies_command,
@@ -25,6 +31,7 @@ from .handlers.anime import (
     schedule_command,
     character_command,
 )
+from .handlers.stats import stats_command
 from .handlers.callbacks import register_callbacks
 
 logging.basicConfig(
@@ -33,11 +40,84 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+_background: set[asyncio.Task] = set()
+
+
+async def prewarm_trending() -> None:
+    feeds = [(media_type, window) for media_type in ("movie", "tv") for window in ("day", "week")]
+    results = await asyncio.gather(
+        *(tmdb.get_trending(media_type, window) for media_type, window in feeds),
+        return_exceptions=True,
+    )
+    for (media_type, _), r in zip(feeds, results):
+        if isinstance(r, Exception):
+            logger.warning("Trending pre-warm failed: %r", r)
+            continue
+        # Trending titles are the likeliest next queries; index them too.
+        aggregator.titles.add_many({"media_type": media_type, **item} for item in r)
+
+
+async def prewarm_loop() -> None:
+    # Runs well inside the TMDB TTL, so trending entries are refreshed in
+    # the background before any user hits an expired one.
+    while True:
+        await prewarm_trending()
+        await asyncio.sleep(config.PREWARM_INTERVAL_SECONDS)
+
+
+async def compact_loop() -> None:
+    while True:
+        await asyncio.sleep(config.STORE_COMPACT_INTERVAL_SECONDS)
+        try:
+            await store.compact()
+        except Exception:
+            logger.exception("Store compaction failed")
+
+
+async def session_sweep_loop(application: Application) -> None:
+    # Users who never come back would otherwise keep their sessions forever.
+    while True:
+        await asyncio.sleep(config.SESSION_IDLE_SECONDS)
+        removed = carousel.sweep(application.user_data)
+        if removed:
+            logger.info("Dropped %d idle poster sessions", removed)
+
+
+def _spawn(coro: Coroutine[Any, Any, None]) -> None:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def on_startup(application: Application) -> None:
+    await http.start()
+    ranking.WEIGHTS.update(config.RANK_WEIGHTS)
+    if config.REDIS_URL:
+        cache.connect_redis(config.REDIS_URL)
+    # The store file is only opened on the first lookup.
+    store.configure(config.STORE_PATH or None)
+    _spawn(prewarm_loop())
+    _spawn(session_sweep_loop(application))
+    if store.enabled:
+        _spawn(compact_loop())
+
+
+async def on_shutdown(application: Application) -> None:
+    for task in list(_background):
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    await http.close()
+    await cache.close_redis()
+    store.close()
+
+
 async def main() -> None:
     application = (
         Application.builder()
         .token(config.BOT_TOKEN)
         .concurrent_updates(True)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
         .build()
     )
 
@@ -59,6 +139,8 @@ async def main() -> None:
     application.add_handler(CommandHandler("character", character_command))
 
     application.add_handler(CommandHandler("p", p_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(InlineQueryHandler(inline_query))
 
     register_callbacks(application)
 
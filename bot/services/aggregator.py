@@ -1,13 +1,52 @@
-from typing import Any, Dict, List, Optional, Literal
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Literal, Tuple
 from . import tmdb
 from . import omdb
 from . import imdb_scraper
 from . import image_scraper
+from . import validator
+from . import phash
+from ..utils.candidate import ImageCandidate
 from ..utils.helpers import dedupe_images, sort_images
-from ..utils.cache import TTLCache
+from ..utils.cache import TieredCache, MISS
+from ..utils.singleflight import SingleFlight
+from ..utils.titleindex import TitleIndex
 from ..config import config
 
-cache = TTLCache(ttl=config.CACHE_TTL_SECONDS)
+logger = logging.getLogger(__name__)
+
+cache = TieredCache(
+    "aggregator",
+    ttl=config.cache_ttl("aggregator"),
+    negative_ttl=config.NEGATIVE_CACHE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+    persist_ttl=config.STORE_TTL_SECONDS,
+)
+flight = SingleFlight("aggregator")
+# Titles already resolved (and the trending feeds), for lookups that need
+# no network call and for typos TMDB cannot place.
+titles = TitleIndex(maxsize=config.TITLE_INDEX_SIZE)
+
+# Wide sources via Google/Bing and other CDNs, in merge order. Batched,
+# the ten `site:` scrapers share one Google query.
+SCRAPERS: List[Callable[[str], Awaitable[List[ImageCandidate]]]] = (
+    [image_scraper.scrape_sites, image_scraper.scrape_bing_images]
+    if config.BATCH_SITE_SCRAPES
+    else [
+        image_scraper.scrape_fanart,
+        image_scraper.scrape_theposterdb,
+        image_scraper.scrape_tvdb,
+        image_scraper.scrape_anidb,
+        image_scraper.scrape_mal,
+        image_scraper.scrape_alphacoders,
+        image_scraper.scrape_wallhaven,
+        image_scraper.scrape_cinematerial,
+        image_scraper.scrape_movieposterdb,
+        image_scraper.scrape_wikimedia,
+        image_scraper.scrape_bing_images,
+    ]
+)
 
 
 async def detect_content_type(query: str) -> str:
@@ -28,24 +67,34 @@ async def detect_content_type(query: str) -> str:
 
 
 async def search_title(query: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    local = titles.lookup(query, year)
+    if local is not None:
+        return local
     key = f"search:{query}:{year}"
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
+    cached = await cache.get(key)
+    if cached is not MISS:
+        return cached if cached is not None else _closest(query, year)
+    return await flight.do(key, lambda: _search_title(key, query, year))
+
 
+async def _search_title(key: str, query: str, year: Optional[int]) -> Optional[Dict[str, Any]]:
     tmdb_results = await tmdb.search_multi(query, year)
+    # Whether every upstream asked gave an answer, empty or not.
+    answered = tmdb_results is not None
     chosen: Optional[Dict[str, Any]] = None
-    for r in tmdb_results:
+    for r in tmdb_results or []:
         if r.get("media_type") in ("movie", "tv"):
             chosen = r
             break
     if not chosen:
         colls = await tmdb.search_collection(query)
+        answered = answered and colls is not None
         if colls:
             chosen = colls[0]
 
     if not chosen:
         omdb_data = await omdb.find_by_title(query, year)
+        answered = answered and (omdb_data is not None or not config.OMDB_API_KEY)
         if omdb_data:
             chosen = {
                 "media_type": "movie",
@@ -64,11 +113,201 @@ async def search_title(query: str, year: Optional[int] = None) -> Optional[Dict[
                 "imdb_id": omdb_data.get("imdbID"),
             }
 
-    cache.set(key, chosen)
-    return chosen
+    if chosen:
+        titles.add(chosen, query)
+        await cache.set(key, chosen)
+        return chosen
+    if not answered:
+        # An outage is not an answer: nothing is cached and the next
+        # search asks upstream again.
+        return None
+    await cache.set(key, None)
+    return _closest(query, year)
+
+
+def _closest(query: str, year: Optional[int]) -> Optional[Dict[str, Any]]:
+    # Upstream has nothing by this spelling; the closest known title within
+    # a typo or two stands in ("narutp" -> "Naruto"). It is never aliased or
+    # cached, so a real title spelled like this shows up once upstream
+    # knows it ("Heat" is not "Beat").
+    close = titles.search(query, year, limit=1)
+    if not close:
+        return None
+    found = close[0][1]
+    logger.info("Resolved %r locally as %r", query, found.get("title") or found.get("name"))
+    return dict(found, approximate=True)
+
+
+def suggest_titles(query: str, limit: int = 3) -> List[str]:
+    # Known titles close to or starting with the query, for "did you mean".
+    found = [r for _, r in titles.search(query, limit=limit)]
+    found += titles.complete(query, limit)
+    names: List[str] = []
+    for r in found:
+        name = r.get("title") or r.get("name")
+        if name and name not in names:
+            names.append(name)
+    return names[:limit]
+
+
+async def gather_within(
+    coros: List[Awaitable[List[ImageCandidate]]], timeout: float
+) -> List[ImageCandidate]:
+    # Run every source at once; whatever finished by the deadline is merged
+    # in the original order, the rest is cancelled.
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Deadline hit, cancelled %d slow image sources", len(pending))
+
+    merged: List[ImageCandidate] = []
+    for t in tasks:
+        if t not in done:
+            continue
+        exc = t.exception()
+        if exc is not None:
+            logger.warning("Image source failed: %r", exc)
+            continue
+        merged.extend(t.result() or [])
+    return merged
+
+
+async def iter_within(
+    coros: List[Awaitable[List[ImageCandidate]]], timeout: float
+) -> AsyncIterator[List[ImageCandidate]]:
+    # Same budget as gather_within, but yields each source as it finishes.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0)
+    pending = {asyncio.ensure_future(c) for c in coros}
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for t in done:
+                exc = t.exception()
+                if exc is not None:
+                    logger.warning("Image source failed: %r", exc)
+                    continue
+                yield t.result() or []
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info("Deadline hit, cancelled %d slow image sources", len(pending))
+
+
+def _image_sources(meta: Dict[str, Any]) -> List[Awaitable[List[ImageCandidate]]]:
+    sources: List[Awaitable[List[ImageCandidate]]] = []
+    # IMDb images
+    if meta.get("imdb_id"):
+        sources.append(imdb_scraper.extract_posters_from_title_page(meta["imdb_id"]))
+    sources.extend(scraper(meta["title"]) for scraper in SCRAPERS)
+    return sources
+
+
+def _images_key(meta: Dict[str, Any]) -> str:
+    return f"images:{meta['title']}:{meta.get('imdb_id')}"
+
+
+def _stage_deadlines(timeout: float) -> Tuple[float, float, float]:
+    # Scraping gets SCRAPE_TIMEOUT_SHARE of the budget; validation and the
+    # near-duplicate pass split what is left 2:1. A slow source then cannot
+    # leave them no time at all.
+    now = asyncio.get_running_loop().time()
+    rest = timeout * (1 - config.SCRAPE_TIMEOUT_SHARE)
+    return now + timeout - rest, now + timeout - rest / 3, now + timeout
+
+
+async def iter_scraped_images(
+    meta: Dict[str, Any], timeout: float
+) -> AsyncIterator[List[ImageCandidate]]:
+    loop = asyncio.get_running_loop()
+    scrape_end, validate_end, _ = _stage_deadlines(timeout)
+    key = _images_key(meta)
+    cached = await cache.get(key)
+    if cached is not MISS:
+        yield await _validated(cached or [], validate_end)
+        return
+    collected: List[ImageCandidate] = []
+    async for batch in iter_within(_image_sources(meta), scrape_end - loop.time()):
+        collected.extend(batch)
+        yield await _validated(batch, validate_end)
+    if collected:
+        await cache.set(key, collected)
+
+
+async def _validated(items: List[ImageCandidate], deadline: float) -> List[ImageCandidate]:
+    # Validation drops dead links and fills in dimensions; with it off,
+    # PROBE_DIMENSIONS still reads headers so scraped images rank by size.
+    if not items or not (config.VALIDATE_IMAGES or config.PROBE_DIMENSIONS):
+        return items
+    remaining = deadline - asyncio.get_running_loop().time()
+    return await validator.validate_images(items, remaining, drop_dead=config.VALIDATE_IMAGES)
+
+
+async def complete_images(meta: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    scrape_end, validate_end, deadline = _stage_deadlines(timeout)
+    key = _images_key(meta)
+    scraped_images = await cache.get(key)
+    if scraped_images is MISS:
+        scraped_images = await gather_within(_image_sources(meta), scrape_end - loop.time())
+        if scraped_images:
+            await cache.set(key, scraped_images)
+    all_images = meta["images"] + scraped_images
+    all_images = dedupe_images(all_images)
+    all_images = await _validated(all_images, validate_end)
+    all_images = await phash.drop_near_duplicates(all_images, deadline - loop.time())
+    meta["images"] = sort_images(all_images, config.MAX_CAROUSEL_IMAGES)
+    return meta
+
+
+def _own_copy(meta: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Coalesced callers share one result; each gets its own image list
+    # because handlers grow and reorder it.
+    if meta is None:
+        return None
+    return {**meta, "images": list(meta["images"])}
 
 
 async def get_metadata_and_images(query: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    meta = await flight.do(
+        f"full:{query}:{year}", lambda: _get_metadata_and_images(query, year)
+    )
+    return _own_copy(meta)
+
+
+async def _get_metadata_and_images(query: str, year: Optional[int]) -> Optional[Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.AGGREGATE_TIMEOUT
+
+    meta = await get_metadata(query, year)
+    if not meta:
+        return None
+    return await complete_images(meta, deadline - loop.time())
+
+
+async def get_metadata(query: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    # TMDB only: answers fast, scraped images are added by complete_images
+    # or streamed by iter_scraped_images.
+    key = f"meta:{query}:{year}"
+    meta = await cache.get(key)
+    if meta is MISS:
+        meta = await flight.do(key, lambda: _get_metadata(key, query, year))
+    return _own_copy(meta)
+
+
+async def _get_metadata(key: str, query: str, year: Optional[int]) -> Optional[Dict[str, Any]]:
     info = await search_title(query, year)
     if not info:
         return None
@@ -83,11 +322,13 @@ async def get_metadata_and_images(query: str, year: Optional[int] = None) -> Opt
 
     tmdb_id = info.get("id")
     details: Dict[str, Any] = {}
-    tmdb_images: List[Dict[str, Any]] = []
+    tmdb_images: List[ImageCandidate] = []
 
     if tmdb_id:
-        details = await tmdb.get_details(media_type, tmdb_id)
-        images = await tmdb.get_images(media_type, tmdb_id)
+        details, images = await asyncio.gather(
+            tmdb.get_details(media_type, tmdb_id),
+            tmdb.get_images(media_type, tmdb_id),
+        )
         tmdb_images = tmdb.build_image_items(images)
 
     title = (
@@ -118,43 +359,22 @@ async def get_metadata_and_images(query: str, year: Optional[int] = None) -> Opt
     overview = details.get("overview") or info.get("overview") or ""
     imdb_id = details.get("imdb_id") or info.get("imdb_id")
 
-    scraped_images: List[Dict[str, Any]] = []
-
-    # IMDb images
-    if imdb_id:
-        scraped_images.extend(
-            await imdb_scraper.extract_posters_from_title_page(imdb_id)
-        )
-
-    # Wide sources via Google/Bing and other CDNs
-    scraped_images.extend(await image_scraper.scrape_fanart(title))
-    scraped_images.extend(await image_scraper.scrape_theposterdb(title))
-    scraped_images.extend(await image_scraper.scrape_tvdb(title))
-    scraped_images.extend(await image_scraper.scrape_anidb(title))
-    scraped_images.extend(await image_scraper.scrape_mal(title))
-    scraped_images.extend(await image_scraper.scrape_alphacoders(title))
-    scraped_images.extend(await image_scraper.scrape_wallhaven(title))
-    scraped_images.extend(await image_scraper.scrape_cinematerial(title))
-    scraped_images.extend(await image_scraper.scrape_movieposterdb(title))
-    scraped_images.extend(await image_scraper.scrape_wikimedia(title))
-    scraped_images.extend(await image_scraper.scrape_bing_images(title))
-
-    all_images = tmdb_images + scraped_images
-    all_images = dedupe_images(all_images)
-    all_images = sort_images(all_images)
-
     detected_type = await detect_content_type(query)
     if media_type == "tv" and detected_type == "Movie/TV":
         detected_type = "TV Show"
     if media_type == "movie" and detected_type == "Movie/TV":
         detected_type = "Movie"
 
-    return {
+    meta = {
         "title": title,
         "year": year_val,
         "rating": rating,
         "genres": genres,
         "overview": overview,
         "content_type": detected_type,
-        "images": all_images,
+        "imdb_id": imdb_id,
+        "images": sort_images(dedupe_images(tmdb_images), config.MAX_CAROUSEL_IMAGES),
     }
+    if not info.get("approximate"):
+        await cache.set(key, meta)
+    return meta
@@ -0,0 +1,149 @@
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+from ..config import config
+from ..utils.cache import TTLCache, approx_size
+from ..utils.helpers import normalize_query
+from .aggregator import get_metadata, complete_images
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = "poster_sessions"
+
+# Ranked results shared by every session showing the same query. A
+# session only holds the key, its position and the URL shown there; the
+# list is looked up (or rebuilt) when the user pages.
+carousels = TTLCache(
+    maxsize=256, ttl=config.SESSION_IDLE_SECONDS, maxbytes=config.CACHE_MAX_BYTES
+)
+
+
+def carousel_key(title: str, year: Optional[int]) -> str:
+    # "/p Naruto" and an inline "naruto" share one list.
+    return f"{normalize_query(title)}:{year}"
+
+
+def user_sessions(user_data: Dict[Any, Any]) -> Dict[str, Dict[str, Any]]:
+    return user_data.setdefault(SESSION_KEY, {})
+
+
+def shared(key: str) -> Optional[Dict[str, Any]]:
+    return carousels.get(key)
+
+
+def keep(key: str, meta: Dict[str, Any]) -> None:
+    # Re-setting refreshes the idle TTL and re-weighs the list after it grew.
+    carousels.set(key, meta)
+
+
+def snapshot(key: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    # Inline pages are separate queries addressed by offset, so they read a
+    # frozen copy: /p sessions grow the shared list in place and re-rank
+    # its tail.
+    frozen = dict(meta, images=list(meta["images"]))
+    carousels.set(f"inline:{key}", frozen)
+    return frozen
+
+
+def open_session(
+    user_data: Dict[Any, Any],
+    session_id: str,
+    title: str,
+    year: Optional[int],
+    meta: Dict[str, Any],
+) -> Dict[str, Any]:
+    key = carousel_key(title, year)
+    keep(key, meta)
+    sessions = user_sessions(user_data)
+    sessions[session_id] = {
+        "key": key,
+        "query": [title, year],
+        "index": 0,
+        "url": meta["images"][0].url,
+        "message_id": None,
+        "last_active": time.time(),
+    }
+    prune(sessions)
+    return sessions[session_id]
+
+
+def _expired(session: Dict[str, Any], now: float) -> bool:
+    return now - session["last_active"] > config.SESSION_IDLE_SECONDS
+
+
+def _drop(sessions: Dict[str, Dict[str, Any]], session_id: str) -> None:
+    task = sessions.pop(session_id).get("prefetch")
+    if task is not None and not task.done():
+        task.cancel()
+
+
+def prune(sessions: Dict[str, Dict[str, Any]]) -> int:
+    # Idle sessions go first, then the least recently used ones beyond the
+    # per-user cap.
+    now = time.time()
+    stale = [sid for sid, s in sessions.items() if _expired(s, now)]
+    excess = len(sessions) - len(stale) - config.MAX_SESSIONS_PER_USER
+    if excess > 0:
+        live = sorted(
+            (sid for sid in sessions if sid not in stale),
+            key=lambda sid: sessions[sid]["last_active"],
+        )
+        stale.extend(live[:excess])
+    for sid in stale:
+        _drop(sessions, sid)
+    return len(stale)
+
+
+def sweep(user_data: Mapping[int, Dict[Any, Any]]) -> int:
+    removed = 0
+    for data in list(user_data.values()):
+        sessions = data.get(SESSION_KEY)
+        if sessions:
+            removed += prune(sessions)
+    return removed
+
+
+def get_session(user_data: Dict[Any, Any], session_id: str) -> Optional[Dict[str, Any]]:
+    session = user_sessions(user_data).get(session_id)
+    if session is None or _expired(session, time.time()):
+        return None
+    return session
+
+
+async def load(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # The shared list, rebuilt from the aggregator caches if it was evicted.
+    # The session index follows its image if the list was re-ranked since.
+    key = session["key"]
+    meta = carousels.get(key)
+    if meta is None:
+        title, year = session["query"]
+        meta = await get_metadata(title, year)
+        if not meta or not meta["images"]:
+            return None
+        await complete_images(meta, config.AGGREGATE_TIMEOUT)
+        logger.debug("Rebuilt carousel %s", key)
+    keep(key, meta)
+
+    images = meta["images"]
+    idx = min(session["index"], len(images) - 1)
+    if images[idx].url != session["url"]:
+        idx = next((i for i, img in enumerate(images) if img.url == session["url"]), idx)
+    session["index"] = idx
+    session["url"] = images[idx].url
+    return meta
+
+
+def stats(user_data: Mapping[int, Dict[Any, Any]]) -> Dict[str, int]:
+    count = 0
+    size = 0
+    for data in user_data.values():
+        sessions = data.get(SESSION_KEY)
+        if sessions:
+            count += len(sessions)
+            size += approx_size(sessions)
+    return {
+        "sessions": count,
+        "bytes": size,
+        "carousels": len(carousels),
+        "carousel_bytes": carousels.currbytes,
+    }
@@ -0,0 +1,25 @@
+from typing import Any, Optional
+from telegram import Message
+from ..config import config
+from ..utils.cache import TieredCache, MISS
+from ..utils.helpers import hash_url
+
+# Telegram file_ids of photos we already sent, keyed by source URL hash.
+# Re-sending by file_id skips Telegram's fetch of the original image.
+cache = TieredCache(
+    "file_id",
+    maxsize=8192,
+    ttl=config.FILE_ID_TTL_SECONDS,
+    persist_ttl=config.FILE_ID_TTL_SECONDS,
+)
+
+
+async def lookup(url: str) -> Optional[str]:
+    file_id = await cache.get(hash_url(url))
+    return None if file_id is MISS else file_id
+
+
+async def remember(url: str, message: Any) -> None:
+    # edit_media returns True instead of a Message for inline messages.
+    if isinstance(message, Message) and message.photo:
+        await cache.set(hash_url(url), message.photo[-1].file_id)
@@ -0,0 +1,91 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import urlsplit
+import aiohttp
+from ..config import config
+from ..utils.ratelimit import HostGuard, for_host
+
+_session: Optional[aiohttp.ClientSession] = None
+_lock = asyncio.Lock()
+
+for _host, (_rate, _burst) in config.HOST_RATE_LIMITS.items():
+    HostGuard(
+        _host,
+        rate=_rate,
+        burst=_burst,
+        threshold=config.BREAKER_FAILURES,
+        reset_timeout=config.BREAKER_RESET_SECONDS,
+        max_wait=config.RATE_LIMIT_MAX_WAIT,
+    )
+
+
+def _build_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=config.HTTP_POOL_SIZE,
+        limit_per_host=config.HTTP_POOL_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=config.DNS_CACHE_TTL,
+        keepalive_timeout=config.HTTP_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def start() -> None:
+    global _session
+    async with _lock:
+        if _session is None or _session.closed:
+            _session = _build_session()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    # Normally opened by the application lifecycle; created lazily so the
+    # services also work when used outside the bot (scripts, REPL).
+    if _session is None or _session.closed:
+        await start()
+    assert _session is not None
+    return _session
+
+
+async def close() -> None:
+    global _session
+    async with _lock:
+        if _session is not None and not _session.closed:
+            await _session.close()
+        _session = None
+
+
+def _healthy(resp: aiohttp.ClientResponse) -> bool:
+    # Google answers abuse with 429 or a redirect to its /sorry/ CAPTCHA.
+    return resp.status != 429 and resp.status < 500 and "/sorry/" not in resp.url.path
+
+
+@asynccontextmanager
+async def request(method: str, url: str, **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+    # session.request behind the per-host limiter and circuit breaker.
+    # Raises HostUnavailable straight away while the host is tripped or
+    # over its rate; hosts without a guard go straight through.
+    session = await get_session()
+    guard = for_host(urlsplit(url).hostname or "")
+    if guard is None:
+        async with session.request(method, url, **kwargs) as resp:
+            yield resp
+        return
+
+    await guard.enter()
+    recorded = False
+    try:
+        async with session.request(method, url, **kwargs) as resp:
+            guard.breaker.record(_healthy(resp))
+            recorded = True
+            yield resp
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        if not recorded:
+            guard.breaker.record(False)
+            recorded = True
+        raise
+    finally:
+        if not recorded:
+            guard.breaker.release()
+
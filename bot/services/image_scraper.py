@@ -1,144 +1,215 @@
-import aiohttp
-from typing import Any, Dict, List
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
 from ..config import config
-from ..utils.cache import TTLCache
-
-cache = TTLCache(ttl=config.CACHE_TTL_SECONDS)
+from . import http
+from ..utils.cache import TieredCache, MISS
+from ..utils.candidate import ImageCandidate
+from ..utils.extract import BingExtractor, Extractor, GoogleExtractor, Hit
+from ..utils.ratelimit import HostUnavailable
+from ..utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_URL = "https://www.google.com/search"
+BING_URL = "https://www.bing.com/images/search"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    "Accept-Language": "en-US,en;q=0.8",
+}
+STREAM_CHUNK = 16 * 1024
+
+# Source tag -> domain for the `site:` scrapers, in merge order.
+SITES: Dict[str, str] = {
+    "fanart": "fanart.tv",
+    "theposterdb": "theposterdb.com",
+    "tvdb": "thetvdb.com",
+    "anidb": "anidb.net",
+    "mal": "myanimelist.net",
+    "alphacoders": "alphacoders.com",
+    "wallhaven": "wallhaven.cc",
+    "cinematerial": "cinematerial.com",
+    "movieposterdb": "movieposterdb.com",
+    "wikimedia": "upload.wikimedia.org",
+}
+
+cache = TieredCache(
+    "scraper",
+    ttl=config.cache_ttl("scraper"),
+    negative_ttl=config.NEGATIVE_CACHE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+)
+flight = SingleFlight("scraper")
 
 
 async def _fetch_json(url: str, params: Dict[str, Any] | None = None, headers: Dict[str, str] | None = None):
     key = f"json:{url}:{sorted((params or {}).items())}"
-    cached = cache.get(key)
-    if cached is not None:
+    cached = await cache.get(key)
+    if cached is not MISS:
         return cached
-    timeout = aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        async with session.get(url, params=params) as resp:
+    return await flight.do(key, lambda: _get_json(key, url, params, headers))
+
+
+async def _get_json(key: str, url: str, params: Dict[str, Any] | None, headers: Dict[str, str] | None):
+    try:
+        async with http.request("GET", url, params=params, headers=headers) as resp:
             if resp.status != 200:
+                if resp.status == 404:
+                    await cache.set(key, None)
                 return None
             data = await resp.json()
-            cache.set(key, data)
-            return data
-
-
-async def _fetch_html(url: str, params: Dict[str, Any] | None = None, headers: Dict[str, str] | None = None) -> str:
-    key = f"html:{url}:{sorted((params or {}).items())}"
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-    timeout = aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        async with session.get(url, params=params) as resp:
+    except HostUnavailable:
+        return None
+    await cache.set(key, data)
+    return data
+
+
+async def _stream_hits(
+    key: str, url: str, params: Dict[str, Any], extractor: Extractor
+) -> AsyncIterator[List[Hit]]:
+    # Parses the result page while it downloads and hangs up once the
+    # extractor has its cap, so the rest of the page is never read.
+    # Finished pages are cached as their hits, never as HTML.
+    cached = await cache.get(key)
+    if cached is not MISS:
+        if cached:
+            yield [Hit(*h) for h in cached]
+        return
+    try:
+        async with http.request("GET", url, params=params, headers=HEADERS) as resp:
             if resp.status != 200:
-                return ""
-            text = await resp.text()
-            cache.set(key, text)
-            return text
-
-
-async def scrape_fanart(title: str) -> List[Dict[str, Any]]:
+                return
+            async for chunk in resp.content.iter_chunked(STREAM_CHUNK):
+                hits = extractor.feed(chunk)
+                if hits:
+                    yield hits
+                if extractor.done:
+                    resp.close()
+                    break
+            else:
+                hits = extractor.close()
+                if hits:
+                    yield hits
+    except HostUnavailable as exc:
+        logger.debug("Skipping %s: %s", url, exc.reason)
+        return
+    # A 200 without results is usually a consent or captcha interstitial:
+    # cached as a negative entry, so it is retried after the short
+    # negative TTL rather than the full scraper TTL.
+    await cache.set(key, extractor.hits or None)
+
+
+async def _collect(stream: AsyncIterator[List[Hit]]) -> List[Hit]:
+    return [hit async for batch in stream for hit in batch]
+
+
+def _google(query: str) -> AsyncIterator[List[Hit]]:
+    return _stream_hits(
+        f"google:hits:{query}",
+        GOOGLE_URL,
+        {"q": query, "tbm": "isch"},
+        GoogleExtractor(config.SCRAPE_MAX_RESULTS),
+    )
+
+
+def _bing(query: str) -> AsyncIterator[List[Hit]]:
+    return _stream_hits(
+        f"bing:hits:{query}", BING_URL, {"q": query}, BingExtractor(config.SCRAPE_MAX_RESULTS)
+    )
+
+
+async def scrape_fanart(title: str) -> List[ImageCandidate]:
     # FanArt.tv does not offer free API for arbitrary search, so we do a simple Google-like scrape of cached images that reference fanart.tv
     query = f"{title} site:fanart.tv"
     return await scrape_google_images(query, tag="fanart")
 
 
-async def scrape_theposterdb(title: str) -> List[Dict[str, Any]]:
+async def scrape_theposterdb(title: str) -> List[ImageCandidate]:
     query = f"{title} site:theposterdb.com"
     return await scrape_google_images(query, tag="theposterdb")
 
 
-async def scrape_tvdb(title: str) -> List[Dict[str, Any]]:
+async def scrape_tvdb(title: str) -> List[ImageCandidate]:
     query = f"{title} site:thetvdb.com"
     return await scrape_google_images(query, tag="tvdb")
 
 
-async def scrape_anidb(title: str) -> List[Dict[str, Any]]:
+async def scrape_anidb(title: str) -> List[ImageCandidate]:
     query = f"{title} site:anidb.net"
     return await scrape_google_images(query, tag="anidb")
 
 
-async def scrape_mal(title: str) -> List[Dict[str, Any]]:
+async def scrape_mal(title: str) -> List[ImageCandidate]:
     query = f"{title} site:myanimelist.net"
     return await scrape_google_images(query, tag="mal")
 
 
-async def scrape_alphacoders(title: str) -> List[Dict[str, Any]]:
+async def scrape_alphacoders(title: str) -> List[ImageCandidate]:
     query = f"{title} site:alphacoders.com"
     return await scrape_google_images(query, tag="alphacoders")
 
 
-async def scrape_wallhaven(title: str) -> List[Dict[str, Any]]:
+async def scrape_wallhaven(title: str) -> List[ImageCandidate]:
     query = f"{title} site:wallhaven.cc"
     return await scrape_google_images(query, tag="wallhaven")
 
 
-async def scrape_cinematerial(title: str) -> List[Dict[str, Any]]:
+async def scrape_cinematerial(title: str) -> List[ImageCandidate]:
     query = f"{title} site:cinematerial.com"
     return await scrape_google_images(query, tag="cinematerial")
 
 
-async def scrape_movieposterdb(title: str) -> List[Dict[str, Any]]:
+async def scrape_movieposterdb(title: str) -> List[ImageCandidate]:
     query = f"{title} site:movieposterdb.com"
     return await scrape_google_images(query, tag="movieposterdb")
 
 
-async def scrape_wikimedia(title: str) -> List[Dict[str, Any]]:
+async def scrape_wikimedia(title: str) -> List[ImageCandidate]:
     query = f"{title} site:upload.wikimedia.org"
     return await scrape_google_images(query, tag="wikimedia")
 
 
-async def scrape_google_images(query: str, tag: str = "google") -> List[Dict[str, Any]]:
-    # Simple HTML scraping of thumbnails
-    params = {"q": query, "tbm": "isch"}
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
-        "Accept-Language": "en-US,en;q=0.8",
-    }
-    html = await _fetch_html("https://www.google.com/search", params=params, headers=headers)
-    import re
-
-    pattern = r"https://[^"']+?.(?:jpg|jpeg|png)"
-    items: List[Dict[str, Any]] = []
-    for m in re.finditer(pattern, html):
-        url = m.group(0)
-        if "gstatic" not in url:
-            items.append(
-                {
-                    "url": url,
-                    "type": "poster",
-                    "width": None,
-                    "height": None,
-                    "popularity": 1,
-                    "clean": False,
-                    "source": tag,
-                }
-            )
-    return items
-
-
-async def scrape_bing_images(query: str) -> List[Dict[str, Any]]:
-    params = {"q": query}
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
-        "Accept-Language": "en-US,en;q=0.8",
-    }
-    html = await _fetch_html("https://www.bing.com/images/search", params=params, headers=headers)
-    import re
-
-    pattern = r"https://[^"']+?.(?:jpg|jpeg|png)"
-    items: List[Dict[str, Any]] = []
-    for m in re.finditer(pattern, html):
-        url = m.group(0)
-        if "mm.bing.net" not in url:
-            items.append(
-                {
-                    "url": url,
-                    "type": "poster",
-                    "width": None,
-                    "height": None,
-                    "popularity": 1,
-                    "clean": False,
-                    "source": "bing",
-                }
-            )
-    return items
+async def _google_hits(query: str) -> List[Hit]:
+    return await flight.do(f"google:{query}", lambda: _collect(_google(query)))
+
+
+def _candidate(hit: Hit, tag: str) -> ImageCandidate:
+    return ImageCandidate(
+        hit.url, width=hit.width, height=hit.height, thumb=hit.thumb, popularity=1, source=tag
+    )
+
+
+async def scrape_google_images(query: str, tag: str = "google") -> List[ImageCandidate]:
+    return [_candidate(hit, tag) for hit in await _google_hits(query)]
+
+
+def site_tag(url: str) -> Optional[str]:
+    host = urlsplit(url).hostname or ""
+    for tag, site in SITES.items():
+        if host == site or host.endswith("." + site):
+            return tag
+    return None
+
+
+async def _scrape_site_batch(title: str, tags: List[str]) -> List[ImageCandidate]:
+    sites = " OR ".join(f"site:{SITES[t]}" for t in tags)
+    hits = await _google_hits(f"{title} ({sites})")
+    # Results hosted elsewhere (mirrors, CDNs) keep the generic tag.
+    return [_candidate(hit, site_tag(hit.url) or "google") for hit in hits]
+
+
+async def scrape_sites(title: str) -> List[ImageCandidate]:
+    # Every SITES source in one Google query (or a few, with
+    # SITES_PER_QUERY), routed back to per-source tags by hostname.
+    tags = list(SITES)
+    step = max(config.SITES_PER_QUERY, 1)
+    batches = await asyncio.gather(
+        *(_scrape_site_batch(title, tags[i : i + step]) for i in range(0, len(tags), step))
+    )
+    return [item for batch in batches for item in batch]
+
+
+async def scrape_bing_images(query: str) -> List[ImageCandidate]:
+    hits = await flight.do(f"bing:{query}", lambda: _collect(_bing(query)))
+    return [_candidate(hit, "bing") for hit in hits]
@@ -1 +1,162 @@
-ul
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import aiohttp
+from ..config import config
+from . import http
+from ..utils.cache import TieredCache, MISS
+from ..utils.candidate import ImageCandidate, ImageType
+from ..utils.ratelimit import HostUnavailable
+from ..utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IMDB_BASE = "https://www.imdb.com/title"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    "Accept-Language": "en-US,en;q=0.8",
+}
+# Widths requested from the CDN for the carousel preview and select.
+VARIANT_WIDTHS = (300, 500, 780)
+THUMB_WIDTH = 96
+
+cache = TieredCache(
+    "imdb",
+    ttl=config.IMDB_TTL_SECONDS,
+    negative_ttl=config.NEGATIVE_CACHE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+    persist_ttl=config.IMDB_TTL_SECONDS,
+)
+flight = SingleFlight("imdb")
+
+_NEXT_DATA = re.compile(
+    r'<script id="__NEXT_DATA__" type="application/json"[^>]*>(.*?)</script>', re.S
+)
+_IMDB_ID = re.compile(r"^tt\d{7,}$")
+
+# Where the title's own images sit in the pages' pageProps: the poster,
+# the title page's photo strip and the media index gallery. Only these
+# are walked; other subtrees hold images of related titles and people.
+IMAGE_PATHS = (
+    ("aboveTheFoldData", "primaryImage"),
+    ("mainColumnData", "titleMainImages"),
+    ("contentData", "data", "title", "images"),
+)
+
+
+def sized_url(url: str, width: int) -> str:
+    # media-amazon URLs end in "._V1_<ops>.jpg"; SX<w> asks the CDN for a
+    # rendition scaled to that width.
+    base, sep, _ = url.rpartition("._V1_")
+    if not sep:
+        return url
+    return f"{base}._V1_SX{width}.jpg"
+
+
+def _variants(url: str, width: Optional[int]) -> List[List[Any]]:
+    variants: List[List[Any]] = [
+        [w, sized_url(url, w)] for w in VARIANT_WIDTHS if not width or w < width
+    ]
+    variants.append([width or 0, url])
+    return variants
+
+
+def _images(node: Any) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+    # Any {"url", "width", "height"} object pointing at the image CDN,
+    # however deep the edges/node wrapping goes.
+    if isinstance(node, dict):
+        url = node.get("url")
+        if isinstance(url, str) and "media-amazon.com/images/" in url:
+            yield url, node.get("width"), node.get("height")
+        for value in node.values():
+            yield from _images(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _images(value)
+
+
+def _next_data(html: str) -> Dict[str, Any]:
+    m = _NEXT_DATA.search(html)
+    if not m:
+        return {}
+    try:
+        return json.loads(m.group(1))
+    except ValueError:
+        return {}
+
+
+def parse_title_page(html: str) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    # Images in IMAGE_PATHS order, so the primary image (the poster) leads.
+    props = _next_data(html).get("props", {}).get("pageProps", {})
+    found: List[Tuple[str, Optional[int], Optional[int]]] = []
+    for path in IMAGE_PATHS:
+        node: Any = props
+        for step in path:
+            node = node.get(step) if isinstance(node, dict) else None
+        found.extend(_images(node))
+    return found
+
+
+def _candidates(found: List[Tuple[str, Optional[int], Optional[int]]]) -> List[ImageCandidate]:
+    items: List[ImageCandidate] = []
+    seen = set()
+    for i, (url, width, height) in enumerate(found):
+        if url in seen:
+            continue
+        seen.add(url)
+        landscape = bool(width and height and width > height)
+        items.append(
+            ImageCandidate(
+                url,
+                type=ImageType.BACKDROP if landscape and i else ImageType.POSTER,
+                width=width,
+                height=height,
+                popularity=1,
+                # The page lists exactly what the CDN serves.
+                clean=True,
+                source="imdb",
+                variants=_variants(url, width),
+                thumb=sized_url(url, THUMB_WIDTH),
+            )
+        )
+    return items
+
+
+async def _get_html(url: str) -> str:
+    try:
+        async with http.request("GET", url, headers=HEADERS) as resp:
+            if resp.status != 200:
+                return ""
+            return await resp.text()
+    except HostUnavailable as exc:
+        logger.debug("Skipping %s: %s", url, exc.reason)
+        return ""
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        logger.debug("IMDb fetch of %s failed: %r", url, exc)
+        return ""
+
+
+async def _fetch(imdb_id: str) -> List[ImageCandidate]:
+    title_html, media_html = await asyncio.gather(
+        _get_html(f"{IMDB_BASE}/{imdb_id}/"),
+        _get_html(f"{IMDB_BASE}/{imdb_id}/mediaindex/"),
+    )
+    if not title_html and not media_html:
+        # Nothing fetched: leave the cache alone so the next /p retries.
+        return []
+    items = _candidates(parse_title_page(title_html) + parse_title_page(media_html))
+    await cache.set(imdb_id, items or None)
+    return items
+
+
+async def extract_posters_from_title_page(imdb_id: str) -> List[ImageCandidate]:
+    # Poster and stills from the title page and media index, cached per
+    # title for IMDB_TTL_SECONDS (also on disk).
+    if not imdb_id or not _IMDB_ID.match(imdb_id):
+        return []
+    cached = await cache.get(imdb_id)
+    if cached is not MISS:
+        return list(cached or [])
+    return list(await flight.do(imdb_id, lambda: _fetch(imdb_id)))
@@ -1,11 +1,19 @@
-import aiohttp
 from typing import Any, Dict, Optional, List
 from ..config import config
-from ..utils.cache import TTLCache
+from . import http
+from ..utils.cache import TieredCache, MISS
+from ..utils.ratelimit import HostUnavailable
+from ..utils.singleflight import SingleFlight
 
 OMDB_BASE = "http://www.omdbapi.com/"
 
-cache = TTLCache(ttl=config.CACHE_TTL_SECONDS)
+cache = TieredCache(
+    "omdb",
+    ttl=config.cache_ttl("omdb"),
+    negative_ttl=config.NEGATIVE_CACHE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+)
+flight = SingleFlight("omdb")
 
 
 async def _request(params: Dict[str, Any]) -> Dict[str, Any]:
@@ -14,27 +22,35 @@ async def _request(params: Dict[str, Any]) -> Dict[str, Any]:
     params = dict(params)
     params["apikey"] = config.OMDB_API_KEY
     key = f"omdb:{sorted(params.items())}"
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-    timeout = aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(OMDB_BASE, params=params) as resp:
+    cached = await cache.get(key)
+    if cached is not MISS:
+        return cached or {}
+    return await flight.do(key, lambda: _fetch(key, params))
+
+
+async def _fetch(key: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        async with http.request("GET", OMDB_BASE, params=params) as resp:
             if resp.status != 200:
+                if resp.status == 404:
+                    await cache.set(key, None)
                 return {}
             data = await resp.json()
-            cache.set(key, data)
-            return data
+    except HostUnavailable:
+        return {}
+    await cache.set(key, data)
+    return data
 
 
 async def find_by_title(title: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
     params: Dict[str, Any] = {"t": title}
     if year:
         params["y"] = str(year)
+    # None when OMDb could not be asked, {} when it has no such title.
     data = await _request(params)
-    if not data or data.get("Response") != "True":
+    if "Response" not in data:
         return None
-    return data
+    return data if data["Response"] == "True" else {}
 
 
 async def search_by_title(title: str) -> List[Dict[str, Any]]:
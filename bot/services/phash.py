@@ -0,0 +1,130 @@
+import asyncio
+import io
+import logging
+from typing import List, Optional
+import aiohttp
+from ..config import config
+from ..utils.bktree import BKTree, hamming
+from ..utils.cache import TieredCache, MISS
+from ..utils.candidate import ImageCandidate
+from ..utils.helpers import hash_url
+from . import http
+
+try:
+    from PIL import Image
+except ImportError:  # near-duplicate detection is skipped without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+cache = TieredCache(
+    "phash",
+    maxsize=16384,
+    ttl=config.PHASH_TTL_SECONDS,
+    negative_ttl=config.VALIDATION_NEGATIVE_TTL_SECONDS,
+    persist_ttl=config.PHASH_TTL_SECONDS,
+)
+_sem = asyncio.Semaphore(config.PHASH_CONCURRENCY)
+
+# Images hashed from the full file (no thumbnail) are skipped when they
+# are too large to fetch just for a 9x8 hash.
+MAX_FETCH_BYTES = 2 * 1024 * 1024
+
+
+def dhash(data: bytes, size: int = 8) -> Optional[int]:
+    # Difference hash: compare neighbouring pixels of a (size+1)x(size)
+    # greyscale thumbnail. Robust to scaling and recompression.
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            # Lets the JPEG decoder downscale while decoding.
+            im.draft("L", (size * 4, size * 4))
+            small = im.convert("L").resize((size + 1, size), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    px = small.tobytes()
+    bits = 0
+    for row in range(size):
+        base = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits
+
+
+async def _fetch(url: str) -> Optional[bytes]:
+    session = await http.get_session()
+    try:
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                return None
+            if resp.content_length and resp.content_length > MAX_FETCH_BYTES:
+                return None
+            data = await resp.content.read(MAX_FETCH_BYTES + 1)
+            return data if len(data) <= MAX_FETCH_BYTES else None
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+async def image_hash(item: ImageCandidate) -> Optional[int]:
+    key = hash_url(item.url)
+    cached = await cache.get(key)
+    if cached is not MISS:
+        return cached
+    async with _sem:
+        data = await _fetch(item.thumb or item.url)
+    value = await asyncio.to_thread(dhash, data) if data else None
+    await cache.set(key, value)
+    return value
+
+
+def _quality(item: ImageCandidate) -> tuple:
+    return ((item.width or 0) * (item.height or 0), item.clean)
+
+
+async def drop_near_duplicates(
+    items: List[ImageCandidate],
+    timeout: float,
+    existing: Optional[List[ImageCandidate]] = None,
+) -> List[ImageCandidate]:
+    # Clusters images whose dHashes are within PHASH_DISTANCE bits and
+    # keeps the highest-resolution member of each cluster. Members of
+    # `existing` always win, so images a user may already have seen stay
+    # put. Items whose hash is not ready by the deadline are kept.
+    if Image is None or not config.NEAR_DUPLICATES or not items:
+        return items
+    existing = existing or []
+    # Google and Bing results carry a small thumb, so large wallpapers are
+    # hashed from it; the size limit only applies to full-file fetches.
+    candidates = [
+        i for i in items if i.thumb or not i.nbytes or i.nbytes <= MAX_FETCH_BYTES
+    ]
+    tasks = {id(i): asyncio.ensure_future(image_hash(i)) for i in existing + candidates}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(timeout, 0))
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def hash_of(item: ImageCandidate) -> Optional[int]:
+        t = tasks.get(id(item))
+        if t is None or t not in done or t.exception() is not None:
+            return None
+        return t.result()
+
+    tree: BKTree[int] = BKTree(hamming)
+    for item in existing:
+        h = hash_of(item)
+        if h is not None:
+            tree.add(h)
+
+    dropped = set()
+    for item in sorted(items, key=_quality, reverse=True):
+        h = hash_of(item)
+        if h is None:
+            continue
+        if tree.search(h, config.PHASH_DISTANCE):
+            dropped.add(id(item))
+        else:
+            tree.add(h)
+    if dropped:
+        logger.info("Dropped %d near-duplicate images", len(dropped))
+    return [i for i in items if id(i) not in dropped]
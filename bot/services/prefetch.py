@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+from telegram import Bot
+from telegram.error import BadRequest, TelegramError
+from telegram.ext import Application
+from ..config import config
+from ..utils.cache import TTLCache
+from ..utils.candidate import ImageCandidate
+from . import file_ids
+from . import http
+
+logger = logging.getLogger(__name__)
+
+_global = asyncio.Semaphore(config.PREFETCH_GLOBAL_LIMIT)
+_per_user: "weakref.WeakValueDictionary[int, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+# URLs found to be broken while warming; pagination skips them for a while.
+dead = TTLCache(maxsize=4096, ttl=config.NEGATIVE_CACHE_TTL_SECONDS)
+# URLs found to be fine, so page turns do not probe the same neighbours
+# again. Warmed ones are also known to file_ids.
+alive = TTLCache(maxsize=4096, ttl=config.VALIDATION_TTL_SECONDS)
+
+# BadRequest texts that are about the image itself rather than the chat
+# or the bot ("Failed to get HTTP URL content", "Wrong type of the web
+# page content", "PHOTO_INVALID_DIMENSIONS", ...).
+_BAD_IMAGE = ("http url", "web page content", "file identifier", "photo_invalid", "image_process_failed")
+
+
+def is_dead(url: str) -> bool:
+    return dead.get(url) is not None
+
+
+def neighbours(images: List[ImageCandidate], idx: int, depth: int) -> List[ImageCandidate]:
+    # next+1, prev-1, next+2, prev-2, ... without repeats or the current one.
+    total = len(images)
+    order: List[int] = []
+    for step in range(1, depth + 1):
+        for i in ((idx + step) % total, (idx - step) % total):
+            if i != idx and i not in order:
+                order.append(i)
+    return [images[i] for i in order]
+
+
+def schedule(app: Application, session: Dict[str, Any], user_id: int, urls: List[str]) -> None:
+    previous = session.get("prefetch")
+    if previous is not None and not previous.done():
+        previous.cancel()
+    if not urls or config.PREFETCH_DEPTH <= 0:
+        return
+    session["prefetch"] = app.create_task(_run(app.bot, session, user_id, urls))
+
+
+def _user_semaphore(user_id: int) -> asyncio.Semaphore:
+    sem = _per_user.get(user_id)
+    if sem is None:
+        sem = asyncio.Semaphore(config.PREFETCH_PER_USER)
+        _per_user[user_id] = sem
+    return sem
+
+
+async def _run(bot: Bot, session: Dict[str, Any], user_id: int, urls: List[str]) -> None:
+    user_sem = _user_semaphore(user_id)
+    for url in urls:
+        if time.time() - session.get("last_active", 0) > config.PREFETCH_IDLE_SECONDS:
+            return
+        if is_dead(url) or alive.get(url) or await file_ids.lookup(url):
+            continue
+        # Per user first: a user's queued tasks must not sit on global slots.
+        async with user_sem, _global:
+            try:
+                ok = await _warm(bot, url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Timeouts, flood limits, network trouble: says nothing
+                # about the image, so it stays in the carousel.
+                logger.debug("Prefetch of %s failed: %r", url, exc)
+                ok = None
+        if ok:
+            alive.set(url, True)
+        elif ok is False:
+            dead.set(url, True)
+
+
+async def _warm(bot: Bot, url: str) -> Optional[bool]:
+    # True once warmed, False when the image is definitely broken, None
+    # when the answer says nothing about it.
+    if config.PREFETCH_CHAT_ID:
+        # Let Telegram fetch the image now, into a private chat, so the
+        # user's edit can go by file_id.
+        try:
+            msg = await bot.send_photo(
+                chat_id=config.PREFETCH_CHAT_ID, photo=url, disable_notification=True
+            )
+        except BadRequest as exc:
+            if any(m in exc.message.lower() for m in _BAD_IMAGE):
+                return False
+            logger.debug("Prefetch of %s rejected: %s", url, exc.message)
+            return None
+        await file_ids.remember(url, msg)
+        try:
+            await msg.delete()
+        except TelegramError:
+            pass
+        return True
+
+    session = await http.get_session()
+    async with session.head(url, allow_redirects=True) as resp:
+        if resp.status in (405, 408, 429) or resp.status >= 500:
+            # HEAD not allowed, throttled or a server hiccup: says nothing
+            # about the image itself.
+            return None
+        if resp.status >= 400:
+            return False
+        return resp.content_type.startswith("image/")
@@ -1,13 +1,27 @@
-import aiohttp
-from typing import Any, Dict, List, Optional, Literal
+from typing import Any, Awaitable, Dict, List, Optional, Literal
 from ..config import config
-from ..utils.cache import TTLCache
+from . import http
+from ..utils.cache import TieredCache, MISS
+from ..utils.candidate import ImageCandidate, ImageType
+from ..utils.singleflight import SingleFlight
 from ..utils.helpers import safe_get
+from ..utils.ratelimit import HostUnavailable
 
 TMDB_BASE = "https://api.themoviedb.org/3"
-IMAGE_BASE = "https://image.tmdb.org/t/p/original"
-
-cache = TTLCache(ttl=config.CACHE_TTL_SECONDS)
+IMAGE_ROOT = "https://image.tmdb.org/t/p"
+IMAGE_BASE = f"{IMAGE_ROOT}/original"
+# Fixed widths TMDB renders for each image type (see /configuration).
+POSTER_SIZES = (342, 500, 780)
+BACKDROP_SIZES = (780, 1280)
+
+cache = TieredCache(
+    "tmdb",
+    ttl=config.cache_ttl("tmdb"),
+    negative_ttl=config.NEGATIVE_CACHE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+    stale_ttl=config.STALE_TTL_SECONDS,
+)
+flight = SingleFlight("tmdb")
 
 
 async def _request(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -18,30 +32,47 @@ async def _request(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[s
     params.setdefault("language", config.DEFAULT_LANGUAGE)
     url = f"{TMDB_BASE}{path}"
     key = f"tmdb:{url}:{sorted(params.items())}"
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-    timeout = aiohttp.ClientTimeout(total=config.REQUEST_TIMEOUT)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(url, params=params) as resp:
+
+    def load() -> Awaitable[Dict[str, Any]]:
+        return flight.do(key, lambda: _fetch(key, url, params))
+
+    cached = await cache.get(key, refresh=load)
+    if cached is not MISS:
+        return cached or {}
+    return await load()
+
+
+async def _fetch(key: str, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        async with http.request("GET", url, params=params) as resp:
             if resp.status != 200:
+                if resp.status == 404:
+                    await cache.set(key, None)
                 return {}
             data = await resp.json()
-            cache.set(key, data)
-            return data
+    except HostUnavailable:
+        return {}
+    await cache.set(key, data)
+    return data
 
 
-async def search_multi(query: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
+def _answered(data: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    # A search TMDB answered always carries "results", even when empty;
+    # None means it could not be asked (no key, error, host unavailable).
+    if "results" not in data:
+        return None
+    return data["results"] or []
+
+
+async def search_multi(query: str, year: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
     params: Dict[str, Any] = {"query": query}
     if year:
         params["year"] = year
-    data = await _request("/search/multi", params)
-    return data.get("results") or []
+    return _answered(await _request("/search/multi", params))
 
 
-async def search_collection(query: str) -> List[Dict[str, Any]]:
-    data = await _request("/search/collection", {"query": query})
-    return data.get("results") or []
+async def search_collection(query: str) -> Optional[List[Dict[str, Any]]]:
+    return _answered(await _request("/search/collection", {"query": query}))
 
 
 async def search_tv(query: str) -> List[Dict[str, Any]]:
@@ -70,7 +101,17 @@ async def get_images(media_type: Literal["movie", "tv"], tmdb_id: int) -> Dict[s
     return await _request(f"/{media_type}/{tmdb_id}/images")
 
 
-def build_image_items(images: Dict[str, Any]) -> List[Dict[str, Any]]:
+def build_variants(path: str, width: Optional[int], sizes: tuple[int, ...]) -> List[List[Any]]:
+    # [[width, url], ...] ascending; the original closes the list. Sizes at
+    # or above the original width would just be the original again.
+    variants: List[List[Any]] = [
+        [w, f"{IMAGE_ROOT}/w{w}{path}"] for w in sizes if not width or w < width
+    ]
+    variants.append([width or 0, f"{IMAGE_BASE}{path}"])
+    return variants
+
+
+def build_image_items(images: Dict[str, Any]) -> List[ImageCandidate]:
     posters = safe_get(images, "posters", default=[]) or []
     backdrops = safe_get(images, "backdrops", default=[]) or []
 
@@ -80,27 +121,33 @@ def build_image_items(images: Dict[str, Any]) -> List[Dict[str, Any]]:
         if not path:
             continue
         items.append(
-            {
-                "url": f"{IMAGE_BASE}{path}",
-                "type": "poster",
-                "width": p.get("width"),
-                "height": p.get("height"),
-                "popularity": p.get("vote_count"),
-                "clean": True,
-            }
+            ImageCandidate(
+                url=f"{IMAGE_BASE}{path}",
+                type=ImageType.POSTER,
+                width=p.get("width"),
+                height=p.get("height"),
+                popularity=p.get("vote_count"),
+                clean=True,
+                source="tmdb",
+                variants=build_variants(path, p.get("width"), POSTER_SIZES),
+                thumb=f"{IMAGE_ROOT}/w92{path}",
+            )
         )
     for b in backdrops:
         path = b.get("file_path")
         if not path:
             continue
         items.append(
-            {
-                "url": f"{IMAGE_BASE}{path}",
-                "type": "backdrop",
-                "width": b.get("width"),
-                "height": b.get("height"),
-                "popularity": b.get("vote_count"),
-                "clean": True,
-            }
+            ImageCandidate(
+                url=f"{IMAGE_BASE}{path}",
+                type=ImageType.BACKDROP,
+                width=b.get("width"),
+                height=b.get("height"),
+                popularity=b.get("vote_count"),
+                clean=True,
+                source="tmdb",
+                variants=build_variants(path, b.get("width"), BACKDROP_SIZES),
+                thumb=f"{IMAGE_ROOT}/w300{path}",
+            )
         )
     return items
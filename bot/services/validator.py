@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+from ..config import config
+from ..utils.cache import TieredCache, MISS
+from ..utils.candidate import ImageCandidate
+from ..utils.helpers import hash_url
+from ..utils.imageinfo import header_size, jpeg_size_at
+from . import http
+
+logger = logging.getLogger(__name__)
+
+cache = TieredCache(
+    "validation",
+    maxsize=8192,
+    ttl=config.VALIDATION_TTL_SECONDS,
+    negative_ttl=config.VALIDATION_NEGATIVE_TTL_SECONDS,
+    maxbytes=config.CACHE_MAX_BYTES,
+    persist_ttl=config.VALIDATION_TTL_SECONDS,
+)
+_sem = asyncio.Semaphore(config.VALIDATION_CONCURRENCY)
+
+PROBE_BYTES = 4096
+# Follow-up ranged reads for JPEGs whose frame header sits behind large
+# EXIF/ICC segments; past this we give up rather than download the file.
+MAX_HEADER_OFFSET = 256 * 1024
+MAX_HEADER_HOPS = 4
+
+
+def _total_size(resp: aiohttp.ClientResponse) -> Optional[int]:
+    # "Content-Range: bytes 0-4095/183422" on a ranged answer, else the
+    # plain length when the server ignored the Range header.
+    content_range = resp.headers.get("Content-Range", "")
+    total = content_range.rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    if resp.status == 200:
+        return resp.content_length
+    return None
+
+
+async def _read_range(url: str, start: int) -> Optional[Tuple[bytes, str, Optional[int]]]:
+    session = await http.get_session()
+    headers = {"Range": f"bytes={start}-{start + PROBE_BYTES - 1}"}
+    async with session.get(url, headers=headers, allow_redirects=True) as resp:
+        if resp.status in (408, 429) or resp.status >= 500:
+            # Throttled or a server hiccup: raised so it reads like a
+            # network error, which says nothing about the image.
+            resp.raise_for_status()
+        if resp.status not in (200, 206):
+            return None
+        if start and resp.status != 206:
+            # Range ignored: the body starts at 0, not at `start`.
+            return None
+        data = b""
+        while len(data) < PROBE_BYTES:
+            chunk = await resp.content.read(PROBE_BYTES - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data, resp.content_type, _total_size(resp)
+
+
+async def _probe(url: str) -> Dict[str, Any]:
+    # "ok" is True for an image, False when the URL is definitely not one
+    # and None when the probe could not tell.
+    try:
+        first = await _read_range(url, 0)
+        if first is None:
+            return {"ok": False}
+        head, content_type, total = first
+        size, offset = header_size(head)
+        # Some CDNs label images application/octet-stream; a recognised
+        # header is proof enough.
+        if not content_type.startswith("image/") and size is None and offset is None:
+            return {"ok": False}
+        hops = 0
+        while size is None and offset is not None and offset < MAX_HEADER_OFFSET and hops < MAX_HEADER_HOPS:
+            try:
+                more = await _read_range(url, offset)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                more = None
+            if more is None:
+                break
+            size, offset = jpeg_size_at(more[0], offset)
+            hops += 1
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return {"ok": None}
+    return {
+        "ok": True,
+        "width": size[0] if size else None,
+        "height": size[1] if size else None,
+        "bytes": total,
+    }
+
+
+async def check_url(url: str) -> Dict[str, Any]:
+    key = hash_url(url)
+    cached = await cache.get(key)
+    if cached is not MISS:
+        return cached or {"ok": False}
+    async with _sem:
+        info = await _probe(url)
+    if info["ok"] is None:
+        # Nothing learnt; the next request probes again.
+        return info
+    # Failures go in as negative entries so they expire sooner.
+    await cache.set(key, info if info["ok"] else None)
+    return info
+
+
+def _needs_probe(item: ImageCandidate, drop_dead: bool) -> bool:
+    if item.clean:
+        return False
+    return drop_dead or not (item.width and item.height)
+
+
+async def validate_images(
+    items: List[ImageCandidate], timeout: float, drop_dead: bool = True
+) -> List[ImageCandidate]:
+    # TMDB ("clean") items are trusted; everything else is probed. Items
+    # whose probe misses the deadline are kept as-is rather than dropped.
+    # With drop_dead=False this only fills in missing dimensions.
+    checks = {
+        id(item): asyncio.ensure_future(check_url(item.url))
+        for item in items
+        if _needs_probe(item, drop_dead)
+    }
+    if not checks:
+        return items
+    done, pending = await asyncio.wait(checks.values(), timeout=max(timeout, 0))
+    for t in pending:
+        t.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    out: List[ImageCandidate] = []
+    dropped = 0
+    for item in items:
+        fut = checks.get(id(item))
+        if fut is None or fut not in done or fut.exception() is not None:
+            out.append(item)
+            continue
+        info = fut.result()
+        if info["ok"] is None:
+            out.append(item)
+            continue
+        if not info["ok"]:
+            if drop_dead:
+                dropped += 1
+            else:
+                out.append(item)
+            continue
+        out.append(
+            item.replace(
+                width=info["width"] or item.width,
+                height=info["height"] or item.height,
+                nbytes=info["bytes"],
+                validated=True,
+            )
+        )
+    if dropped:
+        logger.info("Dropped %d dead or non-image URLs", dropped)
+    return out
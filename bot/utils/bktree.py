@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K")
+
+
+class BKTree(Generic[K]):
+    # Burkhard-Keller tree over any metric (Hamming, Levenshtein, ...).
+    # Range queries only descend into children whose edge distance is
+    # within `radius` of the query's distance to the node.
+    def __init__(self, distance: Callable[[K, K], int]):
+        self.distance = distance
+        self._root: Optional[Tuple[K, Any, Dict[int, Any]]] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: K, value: Any = None) -> None:
+        node = (key, value, {})
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        cur = self._root
+        while True:
+            d = self.distance(key, cur[0])
+            child = cur[2].get(d)
+            if child is None:
+                cur[2][d] = node
+                return
+            cur = child
+
+    def search(self, key: K, radius: int) -> List[Tuple[int, K, Any]]:
+        # (distance, key, value) for every entry within `radius`, closest first.
+        if self._root is None:
+            return []
+        found: List[Tuple[int, K, Any]] = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            d = self.distance(key, node_key)
+            if d <= radius:
+                found.append((d, node_key, value))
+            for edge, child in children.items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda x: x[0])
+        return found
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def levenshtein(a: str, b: str, limit: Optional[int] = None) -> int:
+    # Edit distance. With `limit`, only the diagonal band of width
+    # 2*limit+1 is computed and limit + 1 is returned as soon as the
+    # distance is known to exceed it.
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is None:
+        limit = len(a)
+    over = limit + 1
+    if len(a) - len(b) > limit:
+        return over
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        cur = [i if i <= limit else over] + [over] * len(b)
+        best = cur[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            # min() of the three, spelled out: this loop is the hot path.
+            d = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] < d:
+                d = prev[j] + 1
+            if cur[j - 1] < d:
+                d = cur[j - 1] + 1
+            cur[j] = d
+            if d < best:
+                best = d
+        if best > limit:
+            return over
+        prev = cur
+    return min(prev[-1], over)
@@ -1,45 +1,121 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import math
 import time
 import threading
+import zlib
 from collections import OrderedDict
-from typing import Any, Optional, Callable
+from typing import Any, Awaitable, Dict, Optional, Callable
+from .candidate import ImageCandidate
+from .store import store
+
+logger = logging.getLogger(__name__)
+
+# Returned by TieredCache.get on a miss; a cached None (negative entry)
+# comes back as None.
+MISS = object()
+_NEGATIVE = object()
+
+
+def approx_size(value: Any) -> int:
+    # Rough deep size of JSON-like values; good enough to budget by weight
+    # without the cost of sys.getsizeof on every nested object.
+    if value is None or isinstance(value, (bool, int, float)):
+        return 24
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return 33 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 56 + 8 * len(value) + sum(approx_size(v) for v in value)
+    if isinstance(value, ImageCandidate):
+        # Enum members and interned source tags are shared, not counted.
+        return 16 + 8 * len(ImageCandidate.__slots__) + sum(
+            approx_size(getattr(value, name))
+            for name in ("url", "width", "height", "popularity", "variants", "thumb", "nbytes")
+        )
+    return 64
 
 
 class TTLCache:
-    def __init__(self, maxsize: int = 512, ttl: int = 900):
+    def __init__(self, maxsize: int = 512, ttl: int = 900, maxbytes: Optional[int] = None):
         self.maxsize = maxsize
+        self.maxbytes = maxbytes
         self.ttl = ttl
-        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.currbytes = 0
+        self._data: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        # Min-heap of (expiry, key). Entries are invalidated lazily: a heap
+        # item only evicts its key if the stored expiry still matches.
+        self._expiry: list[tuple[float, str]] = []
         self._lock = threading.Lock()
 
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.currbytes -= entry[2]
+
     def _purge(self) -> None:
         now = time.time()
-        keys_to_delete = []
-        for k, (exp, _) in self._data.items():
-            if exp < now:
-                keys_to_delete.append(k)
-        for k in keys_to_delete:
-            self._data.pop(k, None)
+        heap = self._expiry
+        while heap and heap[0][0] < now:
+            exp, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == exp:
+                self._remove(key)
         while len(self._data) > self.maxsize:
-            self._data.popitem(last=False)
+            _, (_, _, size) = self._data.popitem(last=False)
+            self.currbytes -= size
+        if self.maxbytes is not None:
+            while self._data and self.currbytes > self.maxbytes:
+                _, (_, _, size) = self._data.popitem(last=False)
+                self.currbytes -= size
+        # Overwrites and LRU evictions leave dead heap items behind; rebuild
+        # once they outnumber live ones so the heap stays O(n).
+        if len(heap) > 2 * len(self._data) + 64:
+            self._expiry = [(entry[0], k) for k, entry in self._data.items()]
+            heapq.heapify(self._expiry)
 
     def get(self, key: str) -> Optional[Any]:
         with self._lock:
             self._purge()
-            if key not in self._data:
+            entry = self._data.get(key)
+            if entry is None:
                 return None
-            exp, value = self._data.pop(key)
-            if exp < time.time():
+            if entry[0] < time.time():
                 return None
-            self._data[key] = (exp, value)
-            return value
+            self._data.move_to_end(key)
+            return entry[1]
 
-    def set(self, key: str, value: Any) -> None:
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        # Weighed even without a budget so /stats reports every cache.
+        size = approx_size(value) + approx_size(key)
         with self._lock:
+            exp = time.time() + (self.ttl if ttl is None else ttl)
+            self._remove(key)
+            self._data[key] = (exp, value, size)
+            self.currbytes += size
+            heapq.heappush(self._expiry, (exp, key))
             self._purge()
-            exp = time.time() + self.ttl
-            if key in self._data:
-                self._data.pop(key)
-            self._data[key] = (exp, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.currbytes,
+            "maxbytes": self.maxbytes,
+        }
 
     def cached(self, key_builder: Callable[..., str]):
         def decorator(func: Callable[..., Any]):
@@ -56,3 +132,191 @@ class TTLCache:
             return wrapper
 
         return decorator
+
+
+_redis: Any = None
+_tiered: list["TieredCache"] = []
+
+# One-byte header on every L2 payload. The upper-case tags mark payloads
+# that may carry ImageCandidates; older lower-case ones held image dicts
+# and are read as misses.
+_RAW = b"J"
+_ZLIB = b"Z"
+_NEG = b"n"
+_IMG = "__img__"
+_COMPRESS_MIN = 512
+
+
+def connect_redis(url: str) -> None:
+    global _redis
+    try:
+        import redis.asyncio as aioredis
+    except ImportError:
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+        return
+    _redis = aioredis.from_url(url)
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, ImageCandidate):
+        return {_IMG: value.to_list()}
+    raise TypeError(f"{type(value).__name__} is not cacheable")
+
+
+def _decode(obj: dict) -> Any:
+    if _IMG in obj and len(obj) == 1:
+        return ImageCandidate.from_list(obj[_IMG])
+    return obj
+
+
+# L2 payloads carry the soft expiry next to the value: [soft_exp, value].
+def _dumps(entry: tuple[float, Any]) -> bytes:
+    if entry[1] is _NEGATIVE:
+        return _NEG
+    raw = json.dumps(list(entry), separators=(",", ":"), default=_encode).encode("utf-8")
+    if len(raw) >= _COMPRESS_MIN:
+        return _ZLIB + zlib.compress(raw, 6)
+    return _RAW + raw
+
+
+def _loads(blob: bytes) -> Optional[tuple[float, Any]]:
+    tag, body = blob[:1], blob[1:]
+    if tag == _NEG:
+        return (math.inf, _NEGATIVE)
+    if tag == _ZLIB:
+        body = zlib.decompress(body)
+    elif tag != _RAW:
+        return None
+    soft_exp, value = json.loads(body, object_hook=_decode)
+    return (soft_exp, value)
+
+
+class TieredCache:
+    # In-process LRU (L1) in front of the shared Redis tier (L2). Until
+    # connect_redis() is called this is just the L1 with negative caching.
+    #
+    # Entries are fresh for `ttl` and then stale for another `stale_ttl`:
+    # a stale hit is still served, and kicks off one background refresh
+    # when the caller passes one.
+    #
+    # With persist_ttl set, positive entries are also written to the
+    # on-disk store and read back from it after L1 and L2 miss. persist_ttl
+    # is only how long the row is kept: a row past its soft expiry is a
+    # miss, or served once while `refresh` replaces it.
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 512,
+        ttl: int = 900,
+        negative_ttl: int = 60,
+        maxbytes: Optional[int] = None,
+        stale_ttl: int = 0,
+        persist_ttl: int = 0,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.persist_ttl = persist_ttl
+        self.l1 = TTLCache(maxsize=maxsize, ttl=self.ttl, maxbytes=maxbytes)
+        self._refreshing: Dict[str, asyncio.Future] = {}
+        _tiered.append(self)
+
+    def _l2_key(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"poster:{self.namespace}:{digest}"
+
+    async def get(self, key: str, refresh: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        entry = self.l1.get(key)
+        if entry is None:
+            entry = await self._l2_get(key)
+        if entry is None and self.persist_ttl:
+            entry = await self._disk_get(key, refresh is not None)
+        if entry is None:
+            return MISS
+        soft_exp, value = entry
+        if refresh is not None and time.time() >= soft_exp:
+            self._revalidate(key, refresh)
+        return None if value is _NEGATIVE else value
+
+    async def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        if value is None:
+            entry, ttl = (math.inf, _NEGATIVE), self.negative_ttl
+        else:
+            entry, ttl = (now + self.ttl, value), self.ttl + self.stale_ttl
+        self.l1.set(key, entry, ttl=ttl)
+        await self._l2_set(key, entry, ttl)
+        if self.persist_ttl and value is not None:
+            await store.set(self.namespace, key, _dumps(entry), self.persist_ttl)
+
+    def _revalidate(self, key: str, refresh: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.ensure_future(refresh())
+        self._refreshing[key] = task
+
+        def _done(t: asyncio.Future) -> None:
+            self._refreshing.pop(key, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning("Background refresh failed for %s: %r", self.namespace, t.exception())
+
+        task.add_done_callback(_done)
+
+    async def _l2_get(self, key: str) -> Any:
+        client = _redis
+        if client is None:
+            return None
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                blob, pttl = await pipe.get(self._l2_key(key)).pttl(self._l2_key(key)).execute()
+        except Exception as exc:
+            logger.warning("Redis get failed for %s: %r", self.namespace, exc)
+            return None
+        if blob is None:
+            return None
+        entry = _loads(blob)
+        if entry is None:
+            return None
+        # Promote with the remaining L2 lifetime so L1 never outlives L2.
+        ttl = pttl / 1000 if pttl and pttl > 0 else self.ttl
+        self.l1.set(key, entry, ttl=ttl)
+        return entry
+
+    async def _l2_set(self, key: str, entry: tuple[float, Any], ttl: float) -> None:
+        client = _redis
+        if client is None:
+            return
+        try:
+            await client.set(self._l2_key(key), _dumps(entry), ex=max(1, int(ttl)))
+        except Exception as exc:
+            logger.warning("Redis set failed for %s: %r", self.namespace, exc)
+
+    async def _disk_get(self, key: str, refreshing: bool) -> Any:
+        row = await store.get(self.namespace, key)
+        if row is None:
+            return None
+        blob, expires = row
+        entry = _loads(blob)
+        if entry is None:
+            return None
+        now = time.time()
+        if now >= entry[0]:
+            # Stale: not promoted, so the next get looks again unless the
+            # refresh has replaced it by then.
+            return entry if refreshing else None
+        ttl = min(expires - now, entry[0] - now + self.stale_ttl)
+        self.l1.set(key, entry, ttl=ttl)
+        await self._l2_set(key, entry, ttl)
+        return entry
+
+
+def stats() -> dict[str, dict[str, Any]]:
+    return {c.namespace: c.l1.stats() for c in _tiered}
@@ -0,0 +1,85 @@
+import sys
+from enum import Enum
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+
+class ImageType(str, Enum):
+    POSTER = "poster"
+    BACKDROP = "backdrop"
+
+
+Variant = Tuple[int, str]
+
+
+class ImageCandidate:
+    # One image on offer for a title. Hundreds of these are held per query
+    # by sessions and caches, so slots rather than a dict per image; the
+    # type is an enum singleton and source tags are interned.
+    __slots__ = (
+        "url",
+        "type",
+        "width",
+        "height",
+        "popularity",
+        "clean",
+        "source",
+        "variants",
+        "thumb",
+        "validated",
+        "nbytes",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        type: ImageType = ImageType.POSTER,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        popularity: int = 0,
+        clean: bool = False,
+        source: str = "",
+        variants: Iterable[Sequence[Any]] = (),
+        thumb: Optional[str] = None,
+        validated: bool = False,
+        nbytes: Optional[int] = None,
+    ):
+        self.url = url
+        self.type = ImageType(type)
+        self.width = width
+        self.height = height
+        self.popularity = popularity or 0
+        self.clean = clean
+        self.source = sys.intern(source) if source else ""
+        # Smallest first: ((width, url), ...).
+        self.variants: Tuple[Variant, ...] = tuple((int(w), u) for w, u in variants)
+        self.thumb = thumb
+        self.validated = validated
+        self.nbytes = nbytes
+
+    def __repr__(self) -> str:
+        return f"ImageCandidate({self.url!r}, {self.type.value}, {self.width}x{self.height})"
+
+    def replace(self, **changes: Any) -> "ImageCandidate":
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return ImageCandidate(**fields)
+
+    # Positional form for cache payloads; keeps JSON small.
+    def to_list(self) -> List[Any]:
+        return [
+            self.url,
+            self.type.value,
+            self.width,
+            self.height,
+            self.popularity,
+            self.clean,
+            self.source,
+            [list(v) for v in self.variants],
+            self.thumb,
+            self.validated,
+            self.nbytes,
+        ]
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any]) -> "ImageCandidate":
+        return cls(*values)
@@ -0,0 +1,136 @@
+import codecs
+from abc import ABC, abstractmethod
+import html
+import json
+import re
+from typing import List, NamedTuple, Optional, Pattern, Union
+
+
+class Hit(NamedTuple):
+    url: str
+    width: Optional[int]
+    height: Optional[int]
+    thumb: Optional[str]
+
+
+# Image results embed their metadata as JSON arrays in the page script:
+# [thumb_url, h, w] on gstatic, immediately followed by [url, h, w] for
+# the original. URLs keep JSON escapes (\u003d, \u0026).
+_GOOGLE = re.compile(r'\["(https?://[^"\\]*(?:\\.[^"\\]*)*)",(\d+),(\d+)\]')
+
+# Bing puts each result's JSON, HTML-escaped, in the m="" attribute of
+# the a.iusc anchor; the original size follows in the img_info caption,
+# before the next anchor. One pattern with a literal start: alternations
+# defeat the regex engine's prefix search and run ~50x slower.
+_BING = re.compile(
+    r' m="(\{[^"]*\})"'
+    r'(?:(?:[^<]|<(?!span class="nowrap">|a ))*<span class="nowrap">(\d+) x (\d+)\b)?'
+)
+
+# Unscanned tail carried into the next chunk so a result split across a
+# chunk boundary is still seen whole.
+_KEEP = 8192
+# Matches ending this close to the end of a chunk may be cut short
+# ("1920 x 10|80"); they wait for more data.
+_GUARD = 64
+
+
+class Extractor(ABC):
+    # Incremental: feed() the body as it arrives and collect hits; stops
+    # (done) once `limit` hits are found. Only the carried-over tail of a
+    # chunk is scanned twice.
+    pattern: Pattern[str]
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.hits: List[Hit] = []
+        self._buf = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def done(self) -> bool:
+        return self.limit is not None and len(self.hits) >= self.limit
+
+    def feed(self, chunk: Union[bytes, str], final: bool = False) -> List[Hit]:
+        start = len(self.hits)
+        if not self.done:
+            if isinstance(chunk, bytes):
+                chunk = self._decoder.decode(chunk, final)
+            self._buf += chunk
+            self._scan(final)
+        return self.hits[start:]
+
+    def close(self) -> List[Hit]:
+        return self.feed(b"", final=True)
+
+    def _scan(self, final: bool) -> None:
+        buf = self._buf
+        end = len(buf) if final else len(buf) - _GUARD
+        keep_from = len(buf) if final else max(len(buf) - _KEEP, 0)
+        consumed = 0
+        for m in self.pattern.finditer(buf):
+            if m.end() > end or not (final or self._complete(m, buf)):
+                keep_from = min(keep_from, m.start())
+                break
+            self._match(m)
+            consumed = m.end()
+            if self.done:
+                break
+        self._buf = buf[max(consumed, keep_from) :]
+
+    def _complete(self, m: "re.Match[str]", buf: str) -> bool:
+        # False if more data could still extend this match.
+        return True
+
+    @abstractmethod
+    def _match(self, m: "re.Match[str]") -> None:
+        ...
+
+    def _add(self, url: str, width: Optional[int], height: Optional[int], thumb: Optional[str]) -> None:
+        if not self.done:
+            self.hits.append(Hit(url, width, height, thumb))
+
+
+class GoogleExtractor(Extractor):
+    pattern = _GOOGLE
+
+    def __init__(self, limit: Optional[int] = None):
+        super().__init__(limit)
+        self._thumb: Optional[str] = None
+
+    def _match(self, m: "re.Match[str]") -> None:
+        try:
+            url = json.loads(f'"{m.group(1)}"')
+        except ValueError:
+            return
+        if "gstatic.com" in url:
+            self._thumb = url
+            return
+        self._add(url, int(m.group(3)), int(m.group(2)), self._thumb)
+        self._thumb = None
+
+
+class BingExtractor(Extractor):
+    pattern = _BING
+
+    def _complete(self, m: "re.Match[str]", buf: str) -> bool:
+        # Without its caption the result is only final once the next
+        # anchor has arrived.
+        return m.group(2) is not None or "<a " in buf[m.end() :]
+
+    def _match(self, m: "re.Match[str]") -> None:
+        try:
+            meta = json.loads(html.unescape(m.group(1)))
+        except ValueError:
+            return
+        url = meta.get("murl")
+        if not isinstance(url, str) or not url.startswith("http"):
+            return
+        width = int(m.group(2)) if m.group(2) else None
+        height = int(m.group(3)) if m.group(3) else None
+        self._add(url, width, height, meta.get("turl"))
+
+
+def extract(extractor: Extractor, body: str) -> List[Hit]:
+    extractor.feed(body, final=True)
+    return extractor.hits
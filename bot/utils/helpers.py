@@ -1,14 +1,20 @@
 from typing import Any, Dict, List, Optional
 import hashlib
 import re
+from .candidate import ImageCandidate
+from .ranking import rank_images
+
+
+# Telegram's limit for a photo caption.
+MAX_CAPTION = 1024
 
 
 def normalize_query(text: str) -> str:
-    return re.sub(r"s+", " ", text.strip()).lower()
+    return re.sub(r"\s+", " ", text.strip()).lower()
 
 
 def extract_year_from_query(text: str) -> tuple[str, Optional[int]]:
-    pattern = r"(.*?)(?:s+(d{4}))?$"
+    pattern = r"(.*?)(?:\s+(\d{4}))?$"
     m = re.match(pattern, text.strip())
     if not m:
         return text.strip(), None
@@ -21,11 +27,11 @@ def hash_url(url: str) -> str:
     return hashlib.sha256(url.encode("utf-8")).hexdigest()
 
 
-def dedupe_images(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def dedupe_images(items: List[ImageCandidate]) -> List[ImageCandidate]:
     seen = set()
-    out: List[Dict[str, Any]] = []
+    out: List[ImageCandidate] = []
     for item in items:
-        url = item.get("url")
+        url = item.url
         if not url:
             continue
         h = hash_url(url)
@@ -36,16 +42,37 @@ def dedupe_images(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return out
 
 
-def sort_images(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    def score(x: Dict[str, Any]) -> int:
-        w = x.get("width") or 0
-        h = x.get("height") or 0
-        res = w * h
-        popularity = x.get("popularity") or 0
-        clean_crop = 1 if x.get("clean") else 0
-        return res * 3 + popularity * 5 + clean_crop * 50
+def sort_images(
+    items: List[ImageCandidate], limit: Optional[int] = None
+) -> List[ImageCandidate]:
+    return rank_images(items, k=limit)
+
+
+def pick_variant(item: ImageCandidate, target_width: int) -> str:
+    # Smallest rendition at least target_width wide, else the largest one.
+    variants = item.variants
+    for width, url in variants:
+        if width >= target_width:
+            return url
+    return variants[-1][1] if variants else item.url
 
-    return sorted(items, key=score, reverse=True)
+
+def merge_images(
+    items: List[ImageCandidate],
+    new: List[ImageCandidate],
+    start: int = 0,
+    limit: Optional[int] = None,
+) -> List[ImageCandidate]:
+    # Merge in place so holders of the list see new images. Everything
+    # before `start` keeps its position; the tail is re-ranked and, with
+    # `limit`, cut so the whole list stays within it.
+    seen = {hash_url(i.url) for i in items if i.url}
+    fresh = [i for i in dedupe_images(new) if hash_url(i.url) not in seen]
+    if fresh:
+        start = max(0, min(start, len(items)))
+        keep = None if limit is None else max(limit - start, 0)
+        items[start:] = sort_images(items[start:] + fresh, keep)
+    return items
 
 def build_caption_box(
     title: str,
@@ -65,34 +92,26 @@ def build_caption_box(
     quality_line = "Quality: 480p | 720p | 1080p"
     audio_line = f"Audio: {audio_info}" if audio_info else "Audio: N/A"
     genres_line = f"Genres: {', '.join(genres) if genres else 'N/A'}"
-    trimmed_overview = overview.strip() if overview else "No synopsis available."
-    if len(trimmed_overview) > 900:
-        trimmed_overview = trimmed_overview[:897] + "..."
-    synopsis = "Synopsis:
-" + trimmed_overview
-    return (
-        f"{line}
-"
-        f"{header}
-"
-        f"{line}
-"
-        f"{type_line}
-"
-        f"{rating_line}
-"
-        f"{quality_line}
-"
-        f"{audio_line}
-"
-        f"{genres_line}
-"
-        f"{line}
-"
-        f"{synopsis}
-"
-        f"{line}"
+    head = (
+        f"{line}\n"
+        f"{header}\n"
+        f"{line}\n"
+        f"{type_line}\n"
+        f"{rating_line}\n"
+        f"{quality_line}\n"
+        f"{audio_line}\n"
+        f"{genres_line}\n"
+        f"{line}\n"
+        "Synopsis:\n"
     )
+    tail = f"\n{line}"
+    # Telegram rejects photo captions over MAX_CAPTION characters; the
+    # synopsis gets what the rest of the box leaves.
+    room = min(900, MAX_CAPTION - len(head) - len(tail))
+    trimmed_overview = overview.strip() if overview else "No synopsis available."
+    if len(trimmed_overview) > room:
+        trimmed_overview = trimmed_overview[: max(room - 3, 0)] + "..."
+    return (head + trimmed_overview + tail)[:MAX_CAPTION]
 
 def safe_get(d: Dict[str, Any], *keys, default=None):
     cur = d
@@ -0,0 +1,78 @@
+import struct
+from typing import Optional, Tuple
+
+_PNG_SIG = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (DHT, JPG and DAC share the range but are not SOFs).
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+Size = Tuple[int, int]
+
+
+def image_size(data: bytes) -> Optional[Size]:
+    # (width, height) from the first bytes of a PNG, GIF, WebP or JPEG
+    # file, or None if the header is not recognised or not complete yet.
+    return header_size(data)[0]
+
+
+def header_size(data: bytes) -> Tuple[Optional[Size], Optional[int]]:
+    # Like image_size, but when a JPEG frame header lies past the end of
+    # `data` also returns the file offset to read from next.
+    if data[:8] == _PNG_SIG:
+        if len(data) >= 24 and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24]), None
+        return None, None
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        if len(data) >= 10:
+            return struct.unpack("<HH", data[6:10]), None
+        return None, None
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _webp_size(data), None
+    if data[:2] == b"\xff\xd8":
+        return jpeg_size_at(data, 0, start=2)
+    return None, None
+
+
+def _webp_size(data: bytes) -> Optional[Size]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        w, h = struct.unpack("<HH", data[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(data) >= 30:
+        w = int.from_bytes(data[24:27], "little") + 1
+        h = int.from_bytes(data[27:30], "little") + 1
+        return w, h
+    return None
+
+
+def jpeg_size_at(
+    window: bytes, offset: int, start: int = 0
+) -> Tuple[Optional[Size], Optional[int]]:
+    # Walk JPEG marker segments in `window`, which holds the file from
+    # `offset` on. EXIF thumbnails and ICC profiles often push the frame
+    # header tens of KB in; segment lengths let us jump straight to it.
+    i = start
+    n = len(window)
+    while i + 4 <= n:
+        if window[i] != 0xFF:
+            return None, None
+        marker = window[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            # End of image or start of scan before any frame header.
+            return None, None
+        if marker in _JPEG_SOF:
+            if i + 9 <= n:
+                h, w = struct.unpack(">HH", window[i + 5 : i + 9])
+                return (w, h), None
+            return None, offset + i
+        (seglen,) = struct.unpack(">H", window[i + 2 : i + 4])
+        i += 2 + seglen
+    return None, offset + i
@@ -0,0 +1,110 @@
+from itertools import repeat
+from operator import is_, itemgetter
+from typing import Dict, List, Optional
+import numpy as np
+from .candidate import ImageCandidate, ImageType
+
+FEATURES = ("resolution", "aspect", "trust", "votes", "validated", "poster")
+
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "resolution": 2.0,
+    "aspect": 3.0,
+    "trust": 2.0,
+    "votes": 1.5,
+    "validated": 1.0,
+    "poster": 1.5,
+}
+
+# Updated from config.RANK_WEIGHTS at startup.
+WEIGHTS: Dict[str, float] = dict(DEFAULT_WEIGHTS)
+
+SOURCE_TRUST: Dict[str, float] = {
+    "tmdb": 1.0,
+    "imdb": 0.9,
+    "theposterdb": 0.8,
+    "fanart": 0.8,
+    "tvdb": 0.7,
+    "movieposterdb": 0.6,
+    "cinematerial": 0.6,
+    "wikimedia": 0.6,
+    "mal": 0.6,
+    "anidb": 0.6,
+    "alphacoders": 0.4,
+    "wallhaven": 0.4,
+    "google": 0.3,
+    "bing": 0.3,
+}
+DEFAULT_TRUST = 0.3
+
+POSTER_RATIO = 2 / 3
+# 2000x3000 is a full-size TMDB poster; anything larger scores the same.
+FULL_RESOLUTION = 2000 * 3000
+
+
+def feature_matrix(items: List[ImageCandidate]) -> np.ndarray:
+    # One row per item, one column per FEATURES entry, each in [0, 1].
+    # Plain attribute comprehensions (cheap on slotted candidates) feed
+    # C-level conversions; everything after that is vectorised.
+    n = len(items)
+    if not n:
+        return np.zeros((0, len(FEATURES)))
+    # None (unknown size) converts to NaN.
+    w = np.nan_to_num(np.array([i.width for i in items], dtype=np.float64))
+    h = np.nan_to_num(np.array([i.height for i in items], dtype=np.float64))
+    votes = np.array([i.popularity for i in items], dtype=np.float64)
+    clean = np.array([i.clean for i in items], dtype=bool)
+    validated = np.array([i.validated for i in items], dtype=bool)
+    # Read per call so trust changes apply to candidates already held. An
+    # untagged clean image is a TMDB one.
+    lookup = dict(SOURCE_TRUST)
+    lookup[""] = np.nan
+    trust = np.fromiter(map(lookup.get, [i.source for i in items], repeat(DEFAULT_TRUST)), np.float64, n)
+    untagged = np.isnan(trust)
+    trust[untagged] = np.where(clean[untagged], SOURCE_TRUST.get("tmdb", DEFAULT_TRUST), DEFAULT_TRUST)
+    poster = np.fromiter(map(is_, [i.type for i in items], repeat(ImageType.POSTER)), bool, n)
+
+    out = np.empty((n, len(FEATURES)))
+    known = (w > 0) & (h > 0)
+    np.sqrt(np.minimum(w * h / FULL_RESOLUTION, 1.0), out=out[:, 0])
+    out[~known, 0] = 0.0
+    ratio = np.divide(w, h, out=np.zeros(n), where=h > 0)
+    out[:, 1] = 1.0 - np.minimum(np.abs(ratio - POSTER_RATIO) / POSTER_RATIO, 1.0)
+    out[~known, 1] = 0.5
+    out[:, 2] = trust
+    top_votes = votes.max()
+    if top_votes > 0:
+        np.divide(np.log1p(votes), np.log1p(top_votes), out=out[:, 3])
+    else:
+        out[:, 3] = 0.0
+    out[:, 4] = np.where(clean | validated, 1.0, 0.5)
+    out[:, 5] = poster
+    return out
+
+
+def score(items: List[ImageCandidate], weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    w = weights if weights is not None else WEIGHTS
+    vector = np.array([w.get(f, 0.0) for f in FEATURES], dtype=np.float64)
+    return feature_matrix(items) @ vector
+
+
+def rank_images(
+    items: List[ImageCandidate],
+    weights: Optional[Dict[str, float]] = None,
+    k: Optional[int] = None,
+) -> List[ImageCandidate]:
+    # Best first. With k, only the top k are selected (argpartition) and
+    # sorted, the rest are left out.
+    n = len(items)
+    if n == 0 or (k is not None and k <= 0):
+        return []
+    scores = score(items, weights)
+    if k is not None and k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+    else:
+        idx = np.argsort(-scores, kind="stable")
+    order = idx.tolist()
+    if len(order) == 1:
+        return [items[order[0]]]
+    # itemgetter gathers in C; a comprehension costs a bytecode loop per item.
+    return list(itemgetter(*order)(items))
@@ -0,0 +1,145 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_registry: Dict[str, "HostGuard"] = {}
+
+
+class HostUnavailable(Exception):
+    def __init__(self, host: str, reason: str):
+        super().__init__(f"{host}: {reason}")
+        self.host = host
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    async def acquire(self, max_wait: float) -> bool:
+        # Takes a token, sleeping for it if one is due within max_wait.
+        # Waiters reserve their token up front (the count goes negative) so
+        # later callers queue behind them instead of racing for it.
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        wait = (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            return False
+        self.tokens -= 1
+        await asyncio.sleep(wait)
+        return True
+
+
+class CircuitBreaker:
+    # Opens after `threshold` consecutive failures. After `reset_timeout`
+    # one probe request is let through (half-open): success closes the
+    # circuit, failure opens it for another round.
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record(self, ok: bool) -> None:
+        self._probing = False
+        if ok:
+            self.state = CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        # The request ended without a verdict (cancelled); let another
+        # probe through.
+        self._probing = False
+
+
+class HostGuard:
+    def __init__(
+        self,
+        host: str,
+        rate: float,
+        burst: int,
+        threshold: int,
+        reset_timeout: float,
+        max_wait: float,
+    ):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(threshold, reset_timeout)
+        self.max_wait = max_wait
+        self.allowed = 0
+        self.throttled = 0
+        self.rejected = 0
+        _registry[host] = self
+
+    async def enter(self) -> None:
+        # Raises HostUnavailable without touching the network when the
+        # circuit is open or the limiter cannot grant a slot in time.
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise HostUnavailable(self.host, "circuit open")
+        try:
+            granted = await self.bucket.acquire(self.max_wait)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        if not granted:
+            self.breaker.release()
+            self.throttled += 1
+            raise HostUnavailable(self.host, "rate limited")
+        self.allowed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        self.bucket._refill()
+        return {
+            "state": self.breaker.state,
+            "tokens": round(self.bucket.tokens, 1),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "failures": self.breaker.failures,
+            "trips": self.breaker.trips,
+        }
+
+
+def for_host(host: str) -> Optional[HostGuard]:
+    return _registry.get(host)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {host: g.stats() for host, g in _registry.items()}
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+
+T = TypeVar("T")
+
+_registry: List["SingleFlight"] = []
+
+
+class _Call:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, _Call] = {}
+        _registry.append(self)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._inflight.get(key)
+        if call is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            call = _Call(asyncio.ensure_future(fn()))
+            self._inflight[key] = call
+
+            def _done(f: asyncio.Future) -> None:
+                if key in self._inflight and self._inflight[key].future is f:
+                    del self._inflight[key]
+                # Mark the exception retrieved even if every waiter was cancelled.
+                if not f.cancelled():
+                    f.exception()
+
+            call.future.add_done_callback(_done)
+
+        call.waiters += 1
+        try:
+            # Shielded so one cancelled caller does not cancel the shared call.
+            return await asyncio.shield(call.future)
+        finally:
+            call.waiters -= 1
+            # The last caller gave up (deadline, cancelled handler): nobody
+            # wants the result, so stop the call instead of letting its
+            # requests run on to their timeout.
+            if call.waiters == 0 and not call.future.done():
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+                call.future.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {f.name: f.stats() for f in _registry}
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires);
+"""
+
+
+class PersistentStore:
+    # SQLite in WAL mode: readers never block the single writer, and the
+    # file survives restarts so repeat queries are answered from disk.
+    # Nothing is opened until the first lookup.
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def configure(self, path: Optional[str]) -> None:
+        self.close()
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            assert self.path
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            logger.info("Opened persistent store at %s", self.path)
+        return self._conn
+
+    def _get(self, namespace: str, key: str) -> Optional[tuple[bytes, float]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return bytes(row[0]), row[1]
+
+    def _set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, time.time() + ttl),
+            )
+
+    def _compact(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            removed = conn.execute("DELETE FROM kv WHERE expires < ?", (time.time(),)).rowcount
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    async def get(self, namespace: str, key: str) -> Optional[tuple[bytes, float]]:
+        if not self.enabled:
+            return None
+        try:
+            return await asyncio.to_thread(self._get, namespace, key)
+        except sqlite3.Error as exc:
+            logger.warning("Store read failed for %s: %r", namespace, exc)
+            return None
+
+    async def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._set, namespace, key, value, ttl)
+        except sqlite3.Error as exc:
+            logger.warning("Store write failed for %s: %r", namespace, exc)
+
+    async def compact(self) -> int:
+        if not self.enabled:
+            return 0
+        removed = await asyncio.to_thread(self._compact)
+        logger.info("Store compaction removed %d expired entries", removed)
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+store = PersistentStore()
@@ -0,0 +1,223 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .bktree import levenshtein
+
+_NON_WORD = re.compile(r"[^\w]+")
+_EMPTY: Set[int] = set()
+
+# (key, year, result) per entry id.
+Entry = Tuple[str, Optional[int], Dict[str, Any]]
+
+
+def normalize(text: str) -> str:
+    # "Pokémon: The Movie!" -> "pokemon the movie"
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text.lower()).replace("_", " ").split())
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(key: str) -> int:
+    # Typos allowed for a query of this length; short keys share too few
+    # trigrams to tell a typo from a different title.
+    if len(key) < 4:
+        return 0
+    return 1 if len(key) < 8 else 2
+
+
+def result_year(result: Dict[str, Any]) -> Optional[int]:
+    date = result.get("release_date") or result.get("first_air_date") or ""
+    head = str(date)[:4]
+    return int(head) if head.isdigit() else None
+
+
+def result_names(result: Dict[str, Any]) -> List[str]:
+    names = (
+        result.get("title"),
+        result.get("name"),
+        result.get("original_title"),
+        result.get("original_name"),
+    )
+    return [n for n in names if isinstance(n, str) and n]
+
+
+class TitleIndex:
+    # In-process map from normalized title to a search_title result. Exact
+    # keys are a dict lookup; typos are found through a trigram inverted
+    # index and confirmed by edit distance. Oldest entries are evicted past
+    # `maxsize`.
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, Entry]" = OrderedDict()
+        self._keys: Dict[str, List[int]] = {}
+        # Postings per (trigram, key length): a typo changes the length by
+        # at most the edit distance, so only a few lengths are read.
+        self._grams: Dict[Tuple[str, int], Set[int]] = {}
+        self._ids: Dict[Tuple[str, Any, Any], int] = {}
+        self._sorted: List[str] = []
+        self._dirty = False
+        self._next = 0
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, result: Dict[str, Any], *aliases: str) -> None:
+        # Indexed under its own titles plus any query that resolved to it.
+        year = result_year(result)
+        for name in (*result_names(result), *aliases):
+            key = normalize(name)
+            if not key:
+                continue
+            ident = (key, result.get("media_type"), result.get("id") or result.get("imdb_id"))
+            eid = self._ids.get(ident)
+            if eid is not None:
+                # Known: refresh the result and its place in the eviction order.
+                self._entries[eid] = (key, year, result)
+                self._entries.move_to_end(eid)
+                continue
+            eid = self._next
+            self._next += 1
+            self._entries[eid] = (key, year, result)
+            self._ids[ident] = eid
+            if key not in self._keys:
+                self._keys[key] = []
+                self._dirty = True
+            self._keys[key].append(eid)
+            for g in trigrams(key):
+                self._grams.setdefault((g, len(key)), set()).add(eid)
+        while len(self._entries) > self.maxsize:
+            self._evict()
+
+    def add_many(self, results: Iterable[Dict[str, Any]]) -> None:
+        for r in results:
+            if r.get("media_type") in ("movie", "tv"):
+                self.add(r)
+
+    def _evict(self) -> None:
+        eid, (key, _, result) = self._entries.popitem(last=False)
+        self._ids.pop((key, result.get("media_type"), result.get("id") or result.get("imdb_id")), None)
+        ids = self._keys[key]
+        ids.remove(eid)
+        if not ids:
+            del self._keys[key]
+            self._dirty = True
+        for g in trigrams(key):
+            posting = self._grams[g, len(key)]
+            posting.discard(eid)
+            if not posting:
+                del self._grams[g, len(key)]
+
+    def _pick(self, ids: Iterable[int], year: Optional[int]) -> List[Dict[str, Any]]:
+        # Matching year (or unknown year) first, most popular first.
+        found = [
+            self._entries[i] for i in ids if year is None or self._entries[i][1] in (year, None)
+        ]
+        found.sort(key=lambda e: (year is not None and e[1] != year, -(e[2].get("popularity") or 0)))
+        return [e[2] for e in found]
+
+    def lookup(self, query: str, year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        found = self._pick(self._keys.get(normalize(query), ()), year)
+        if found:
+            self.hits += 1
+            return found[0]
+        return None
+
+    def search(
+        self, query: str, year: Optional[int] = None, limit: int = 5
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        # (edit distance, result) for titles within max_distance of the
+        # query, closest first.
+        key = normalize(query)
+        if not key:
+            return []
+        dist = max_distance(key)
+        grams = trigrams(key)
+        lengths = range(len(key) - dist, len(key) + dist + 1)
+        postings = {g: [self._grams.get((g, n), _EMPTY) for n in lengths] for g in grams}
+        # One edit changes at most three trigrams, so a match within `dist`
+        # shares all but 3*dist of them and must appear in at least one of
+        # the 3*dist+1 rarest postings: only those are unioned.
+        rarest = sorted(grams, key=lambda g: sum(map(len, postings[g])))
+        candidates: Set[int] = set()
+        for g in rarest[: 3 * dist + 1]:
+            candidates.update(*postings[g])
+        # The same bound over every trigram, checked rarest first so most
+        # candidates are ruled out after a few lookups.
+        by_length = {n: [postings[g][i] for g in rarest] for i, n in enumerate(lengths)}
+        scored: Dict[str, int] = {}
+        for eid in candidates:
+            other = self._entries[eid][0]
+            if other in scored:
+                continue
+            missing = 0
+            for posting in by_length[len(other)]:
+                if eid not in posting:
+                    missing += 1
+                    if missing > 3 * dist:
+                        break
+            else:
+                scored[other] = levenshtein(key, other, dist)
+
+        found: List[Tuple[int, Dict[str, Any]]] = []
+        for other, d in sorted(scored.items(), key=lambda kv: kv[1]):
+            if d > dist:
+                break
+            for result in self._pick(self._keys[other], year):
+                found.append((d, result))
+        found = _unique(found)[:limit]
+        if found:
+            self.fuzzy_hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        # Titles starting with `prefix`, for autocomplete.
+        key = normalize(prefix)
+        if not key:
+            return []
+        if self._dirty:
+            self._sorted = sorted(self._keys)
+            self._dirty = False
+        keys = self._sorted
+        found: List[Tuple[int, Dict[str, Any]]] = []
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i].startswith(key) and len(found) < limit * 4:
+            # A key evicted since the last sort is simply skipped.
+            for result in self._pick(self._keys.get(keys[i], ()), None):
+                found.append((0, result))
+            i += 1
+        found.sort(key=lambda dr: -(dr[1].get("popularity") or 0))
+        return [r for _, r in _unique(found)[:limit]]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "titles": len(self._entries),
+            "keys": len(self._keys),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
+
+
+def _unique(found: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+    # The same result indexed under several keys is listed once.
+    seen: Set[int] = set()
+    out = []
+    for d, result in found:
+        if id(result) in seen:
+            continue
+        seen.add(id(result))
+        out.append((d, result))
+    return out
@@ -0,0 +1,211 @@
+import asyncio
+import time
+
+import fakeredis.aioredis
+import pytest
+
+from bot.utils import cache
+from bot.utils.cache import MISS, TieredCache
+from bot.utils.candidate import ImageCandidate, ImageType
+
+
+def run(coro_fn):
+    # A fresh fake Redis per test, bound to the test's event loop.
+    async def main():
+        client = fakeredis.aioredis.FakeRedis()
+        cache._redis = client
+        try:
+            await coro_fn(client)
+        finally:
+            cache._redis = None
+            await client.aclose()
+
+    asyncio.run(main())
+
+
+def images():
+    return [
+        ImageCandidate(
+            "https://image.tmdb.org/t/p/original/a.jpg",
+            type=ImageType.POSTER,
+            width=2000,
+            height=3000,
+            popularity=12,
+            clean=True,
+            source="tmdb",
+            variants=[(500, "https://image.tmdb.org/t/p/w500/a.jpg")],
+            thumb="https://image.tmdb.org/t/p/w92/a.jpg",
+        ),
+        ImageCandidate("https://example.org/b.png", type=ImageType.BACKDROP, source="bing"),
+    ]
+
+
+def test_round_trip_through_l1_and_l2():
+    async def body(client):
+        c = TieredCache("test-roundtrip", ttl=300)
+        meta = {"title": "Naruto", "images": images()}
+        await c.set("k", meta)
+        assert (await c.get("k"))["images"][0].url == meta["images"][0].url
+
+        # Only L2 left: the value is decoded back into ImageCandidates.
+        c.l1.delete("k")
+        got = await c.get("k")
+        assert got["title"] == "Naruto"
+        assert [i.to_list() for i in got["images"]] == [i.to_list() for i in meta["images"]]
+        assert isinstance(got["images"][1].type, ImageType)
+
+    run(body)
+
+
+def test_negative_entries_use_negative_ttl():
+    async def body(client):
+        c = TieredCache("test-negative", ttl=300, negative_ttl=20)
+        await c.set("gone", None)
+        assert await c.get("gone") is None
+        assert 0 < await client.ttl(c._l2_key("gone")) <= 20
+
+        c.l1.delete("gone")
+        assert await c.get("gone") is None
+        assert await c.get("never-set") is MISS
+
+    run(body)
+
+
+def test_promotion_keeps_remaining_l2_lifetime():
+    async def body(client):
+        c = TieredCache("test-promote", ttl=300)
+        await c.set("k", {"v": 1})
+        await client.pexpire(c._l2_key("k"), 5000)
+        c.l1.delete("k")
+
+        assert await c.get("k") == {"v": 1}
+        expires = c.l1._data["k"][0]
+        assert expires - time.time() == pytest.approx(5, abs=1)
+
+    run(body)
+
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        raise ConnectionError("redis down")
+
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+
+def test_redis_errors_are_misses():
+    async def body(client):
+        c = TieredCache("test-broken", ttl=300)
+        cache._redis = BrokenRedis()
+        await c.set("k", {"v": 1})
+        assert await c.get("k") == {"v": 1}
+
+        c.l1.delete("k")
+        assert await c.get("k") is MISS
+
+    run(body)
+
+
+def test_sizes_are_tracked_without_a_byte_budget():
+    c = cache.TTLCache(maxsize=8)
+    c.set("k", "x" * 100)
+    assert c.stats()["bytes"] > 100
+    c.delete("k")
+    assert c.stats()["bytes"] == 0
+
+
+def test_disk_rows_past_their_ttl_are_stale(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache.store, "path", str(tmp_path / "store.db"))
+    monkeypatch.setattr(cache.store, "_conn", None)
+    refreshed = []
+
+    async def refresh():
+        refreshed.append(True)
+
+    async def body(client):
+        c = TieredCache("test-disk", ttl=300, persist_ttl=3600)
+        await c.set("k", {"v": 1})
+        c.l1.delete("k")
+        await client.delete(c._l2_key("k"))
+        # Fresh on disk: promoted back into L1 and L2.
+        assert await c.get("k") == {"v": 1}
+        assert "k" in c.l1._data
+
+        c.l1.delete("k")
+        await client.delete(c._l2_key("k"))
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 301)
+        assert await c.get("k") is MISS
+        # With a refresh the stale row is served once and revalidated.
+        assert await c.get("k", refresh=refresh) == {"v": 1}
+        await asyncio.sleep(0)
+        assert refreshed == [True]
+        assert "k" not in c.l1._data
+        assert await client.get(c._l2_key("k")) is None
+
+    try:
+        run(body)
+    finally:
+        cache.store.close()
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(time, "time", c)
+    return c
+
+
+def test_per_entry_ttl(clock):
+    c = cache.TTLCache(maxsize=8, ttl=100)
+    c.set("short", 1, ttl=5)
+    c.set("default", 2)
+    clock.now += 6
+    assert c.get("short") is None
+    assert c.get("default") == 2
+    assert len(c) == 1
+    clock.now += 100
+    assert c.get("default") is None
+    assert c.stats()["bytes"] == 0
+
+
+def test_maxsize_evicts_least_recently_used(clock):
+    c = cache.TTLCache(maxsize=3, ttl=100)
+    for k in "abc":
+        c.set(k, k)
+    assert c.get("a") == "a"
+    c.set("d", "d")
+    assert c.get("b") is None
+    assert [c.get(k) for k in "acd"] == ["a", "c", "d"]
+
+
+def test_overwrite_outlives_old_expiry(clock):
+    c = cache.TTLCache(maxsize=8, ttl=100)
+    c.set("k", "old", ttl=5)
+    c.set("k", "new", ttl=50)
+    clock.now += 10
+    # The old heap item is due but no longer matches the stored expiry.
+    assert c.get("k") == "new"
+    clock.now += 50
+    assert c.get("k") is None
+
+
+def test_heap_rebuild_keeps_live_entries(clock):
+    c = cache.TTLCache(maxsize=10, ttl=100)
+    for i in range(200):
+        c.set(f"k{i % 10}", i)
+    # Overwrites leave dead heap items; the rebuild drops them.
+    assert len(c._expiry) <= 2 * len(c) + 64
+    assert {k for _, k in c._expiry} == set(c._data)
+    assert [c.get(f"k{i}") for i in range(10)] == list(range(190, 200))
+    clock.now += 101
+    assert c.get("k0") is None
+    assert len(c) == 0
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+from bot.utils.extract import BingExtractor, GoogleExtractor, Hit, extract
+
+FIXTURES = Path(__file__).parent / "fixtures"
+CHUNK = 16 * 1024
+
+
+def page(name):
+    return (FIXTURES / name).read_bytes()
+
+
+def chunked(extractor, body, size=CHUNK):
+    for i in range(0, len(body), size):
+        extractor.feed(body[i : i + size])
+        if extractor.done:
+            break
+    else:
+        extractor.close()
+    return extractor.hits
+
+
+def test_google_hits():
+    hits = extract(GoogleExtractor(), page("google_images.html").decode("utf-8"))
+    assert len(hits) == 8
+    # [url, height, width] on the page; JSON escapes are undone.
+    assert hits[0].url.startswith("https://m.media-amazon.com/images/M/MV5B")
+    assert (hits[0].width, hits[0].height) == (1434, 2048)
+    assert hits[0].thumb.startswith("https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRkW1xq3")
+    assert hits[1] == Hit(
+        "https://image.tmdb.org/t/p/original/xppeysfvDKVx775MFuH8Z9BlpMk.jpg",
+        2000,
+        3000,
+        hits[1].thumb,
+    )
+    assert hits[3].url == (
+        "https://cdn.shopify.com/s/files/1/0150/6262/products/naruto-poster.png"
+        "?v=1571439088&width=1445"
+    )
+    assert not any("gstatic.com" in h.url for h in hits)
+
+
+def test_bing_hits():
+    hits = extract(BingExtractor(), page("bing_images.html").decode("utf-8"))
+    assert [h.url for h in hits] == [
+        "https://image.tmdb.org/t/p/original/xppeysfvDKVx775MFuH8Z9BlpMk.jpg",
+        "https://m.media-amazon.com/images/I/71K8hZ2sPxL._AC_SL1500_.jpg",
+        "https://wallpapers.com/images/hd/naruto-poster-3v8x9z1q2w4e6r7t.webp",
+        "https://upload.wikimedia.org/wikipedia/en/9/94/NarutoCoverTankobon1.jpg",
+        "https://images-na.ssl-images-amazon.com/images/I/81bBn-Rc6-L.png",
+        "https://cdn.myanimelist.net/images/anime/13/17405l.jpg",
+    ]
+    assert (hits[0].width, hits[0].height) == (2000, 3000)
+    assert hits[0].thumb == "https://tse1.mm.bing.net/th?id=OIP.Xk1pQ4nW3vY8tZ2uA9bC5dHaLH&pid=15.1"
+    # No img_info caption on this result: size unknown, not borrowed.
+    assert (hits[3].width, hits[3].height) == (None, None)
+    assert (hits[4].width, hits[4].height) == (1095, 1500)
+
+
+@pytest.mark.parametrize(
+    "cls, name",
+    [(GoogleExtractor, "google_images.html"), (BingExtractor, "bing_images.html")],
+)
+@pytest.mark.parametrize("size", [CHUNK, 1000, 7])
+def test_chunked_matches_whole_page(cls, name, size):
+    body = page(name)
+    assert chunked(cls(), body, size) == extract(cls(), body.decode("utf-8"))
+
+
+@pytest.mark.parametrize(
+    "cls, name",
+    [(GoogleExtractor, "google_images.html"), (BingExtractor, "bing_images.html")],
+)
+def test_limit_stops_early(cls, name):
+    body = page(name)
+    extractor = cls(3)
+    assert chunked(extractor, body) == extract(cls(), body.decode("utf-8"))[:3]
+    assert extractor.done
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.utils import ratelimit
+from bot.utils.ratelimit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, HostGuard, HostUnavailable, TokenBucket
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # Guards register themselves by host; keep the test ones out of /stats.
+    monkeypatch.setattr(ratelimit, "_registry", {})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(time, "monotonic", c)
+    return c
+
+
+@pytest.fixture
+def sleeps(monkeypatch, clock):
+    # Sleeping only records the wait and yields once.
+    waits = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        waits.append(round(delay, 6))
+        await real_sleep(0)
+
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", sleep)
+    return waits
+
+
+def drain(bucket):
+    bucket._refill()
+    bucket.tokens = 0
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    b = CircuitBreaker(threshold=3, reset_timeout=10)
+    b.record(False)
+    b.record(False)
+    assert b.state == CLOSED and b.allow()
+    b.record(False)
+    assert b.state == OPEN and b.trips == 1
+    assert not b.allow()
+
+    clock.now += 10
+    assert b.allow()
+    assert b.state == HALF_OPEN
+    # One probe at a time.
+    assert not b.allow()
+    b.record(False)
+    assert b.state == OPEN and b.trips == 2
+    clock.now += 9
+    assert not b.allow()
+
+    clock.now += 1
+    assert b.allow()
+    b.record(True)
+    assert b.state == CLOSED and b.failures == 0
+    assert b.allow() and b.allow()
+
+
+def test_release_lets_another_probe_through(clock):
+    b = CircuitBreaker(threshold=1, reset_timeout=5)
+    b.record(False)
+    clock.now += 5
+    assert b.allow()
+    b.release()
+    assert b.state == HALF_OPEN
+    assert b.allow()
+
+
+def test_bucket_reserves_tokens_for_waiters(sleeps):
+    bucket = TokenBucket(rate=10, burst=1)
+
+    async def body():
+        assert await bucket.acquire(1)
+        # Each waiter reserves its token, so the next one queues behind it.
+        first, second = await asyncio.gather(bucket.acquire(1), bucket.acquire(1))
+        assert first and second
+        assert sleeps == [0.1, 0.2]
+        assert bucket.tokens == pytest.approx(-2)
+        # Too long a wait: refused without taking a token.
+        assert not await bucket.acquire(0.25)
+        assert bucket.tokens == pytest.approx(-2)
+
+    asyncio.run(body())
+
+
+def test_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    bucket.tokens = 0
+    clock.now += 1
+    bucket._refill()
+    assert bucket.tokens == pytest.approx(2)
+    clock.now += 10
+    bucket._refill()
+    assert bucket.tokens == 3
+
+
+def test_cancelled_probe_releases_the_breaker(clock):
+    guard = HostGuard("cancel.test", rate=1, burst=1, threshold=1, reset_timeout=5, max_wait=10)
+    guard.breaker.record(False)
+    clock.now += 5
+    drain(guard.bucket)
+
+    async def body():
+        # The probe waits on the limiter and is cancelled there.
+        task = asyncio.ensure_future(guard.enter())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert guard.breaker.allow()
+
+    asyncio.run(body())
+
+
+def test_rate_limited_probe_releases_the_breaker(clock):
+    guard = HostGuard("throttled.test", rate=1, burst=1, threshold=1, reset_timeout=5, max_wait=0.5)
+    guard.breaker.record(False)
+    clock.now += 5
+    drain(guard.bucket)
+
+    async def body():
+        with pytest.raises(HostUnavailable) as exc:
+            await guard.enter()
+        assert exc.value.reason == "rate limited"
+        assert guard.throttled == 1
+        assert guard.breaker.allow()
+
+    asyncio.run(body())
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from bot.utils.bktree import levenshtein
+from bot.utils.titleindex import TitleIndex
+
+
+def movie(ident, title, year=None, popularity=0.0):
+    result = {"media_type": "movie", "id": ident, "title": title, "popularity": popularity}
+    if year:
+        result["release_date"] = f"{year}-01-01"
+    return result
+
+
+def full_levenshtein(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+@pytest.mark.parametrize(
+    "a, b, d",
+    [("", "", 0), ("naruto", "naruto", 0), ("naruto", "narutp", 1), ("heat", "beat", 1),
+     ("kitten", "sitting", 3), ("", "abc", 3), ("abc", "", 3)],
+)
+def test_levenshtein(a, b, d):
+    assert levenshtein(a, b) == d
+
+
+def test_levenshtein_limit_matches_full_distance():
+    rng = random.Random(3)
+    for _ in range(500):
+        a = "".join(rng.choices("abcd", k=rng.randint(0, 9)))
+        b = "".join(rng.choices("abcd", k=rng.randint(0, 9)))
+        d = full_levenshtein(a, b)
+        for limit in range(4):
+            # Exact within the limit, limit + 1 beyond it.
+            assert levenshtein(a, b, limit) == min(d, limit + 1)
+
+
+def test_exact_lookup_and_aliases():
+    index = TitleIndex()
+    naruto = movie(1, "Naruto", 2002)
+    index.add(naruto, "naruto tv")
+    assert index.lookup("NARUTO!") is naruto
+    assert index.lookup("Naruto TV") is naruto
+    assert index.lookup("Narutp") is None
+
+
+def test_search_finds_typos_within_distance():
+    index = TitleIndex()
+    naruto = movie(1, "Naruto", 2002)
+    inception = movie(2, "Inception", 2010)
+    index.add(naruto)
+    index.add(inception)
+    assert index.search("narutp") == [(1, naruto)]
+    # Eight characters and up allow two edits.
+    assert index.search("incepshun") == []
+    assert index.search("incepton") == [(1, inception)]
+    assert index.search("insepton") == [(2, inception)]
+    # Under four characters only exact keys count.
+    index.add(movie(3, "Up", 2009))
+    assert index.search("uq") == []
+
+
+def test_search_filters_and_orders_by_year():
+    index = TitleIndex()
+    old = movie(1, "Dune", 1984, popularity=10)
+    new = movie(2, "Dune", 2021, popularity=90)
+    undated = movie(3, "Dune", popularity=50)
+    for r in (old, new, undated):
+        index.add(r)
+    assert [r for _, r in index.search("dunee", 1984)] == [old, undated]
+    assert [r for _, r in index.search("dunee")] == [new, undated, old]
+    assert index.lookup("dune", 2021) is new
+    assert index.lookup("dune", 1999) is undated
+
+
+def test_eviction_cleans_up_every_structure():
+    index = TitleIndex(maxsize=2)
+    first = movie(1, "Naruto", 2002)
+    index.add(first)
+    index.add(movie(2, "Bleach", 2004))
+    index.add(movie(3, "Inuyasha", 2000))
+    assert len(index) == 2
+    assert index.lookup("naruto") is None
+    assert index.search("narutp") == []
+    assert index.complete("nar") == []
+    assert "naruto" not in index._keys
+    live = set(index._entries)
+    assert all(posting and posting <= live for posting in index._grams.values())
+    assert ("naruto", "movie", 1) not in index._ids
+
+    # Re-adding a known entry refreshes it instead of duplicating it.
+    bleach = movie(2, "Bleach", 2004, popularity=5)
+    index.add(bleach)
+    assert len(index) == 2
+    assert index.lookup("bleach") is bleach
+    index.add(movie(4, "Gintama", 2006))
+    assert index.lookup("inuyasha") is None
+    assert index.lookup("bleach") is bleach